@@ -0,0 +1,320 @@
+"""
+Audio Preprocessing
+以 ffmpeg 將輸入音訊轉為 API 可直接使用的片段
+片段邊界以 silencedetect 找出的靜音位置規劃，避免把字句從中間切斷
+可選擇在同一次編碼中移除過長的靜音，並以時間對照表將轉錄時間軸還原到原始音訊
+"""
+import os
+import re
+import json
+import asyncio
+import bisect
+import subprocess
+import logging
+from typing import Dict, Any, List, Tuple, Optional
+
+MAX_FILE_SIZE_MB = 24
+# 目標片段長度；實際邊界會移到附近的靜音處
+CHUNK_DURATION_SEC = int(os.environ.get("S2T_CHUNK_DURATION_SEC", "600"))
+
+# 靜音偵測：低於 SILENCE_NOISE_DB 且持續 SILENCE_MIN_SEC 秒以上視為靜音
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_SEC = 0.4
+# 在目標邊界前後多少秒內尋找靜音
+BOUNDARY_SEARCH_SEC = 60
+# 重疊模式：每個片段額外附上下一段開頭的秒數（0 表示關閉）
+CHUNK_OVERLAP_SEC = float(os.environ.get("S2T_CHUNK_OVERLAP_SEC", "0"))
+
+# 移除靜音：超過 STRIP_SILENCE_MIN_SEC 秒的靜音不送往 API（Groq 依音訊秒數計費與限流）
+STRIP_SILENCE = os.environ.get("S2T_STRIP_SILENCE", "0") == "1"
+STRIP_SILENCE_MIN_SEC = float(os.environ.get("S2T_STRIP_SILENCE_MIN_SEC", "2.0"))
+# 移除靜音時兩側各保留的秒數，避免截掉字首字尾
+STRIP_SILENCE_PAD_SEC = 0.25
+
+# 上傳至 API 的音訊格式：16kHz 單聲道低比特率 MP3
+AUDIO_BITRATE_KBPS = 32
+# 預處理結果（片段清單、時間對照表）保存在片段目錄中，重新執行時不必再跑 ffmpeg
+MANIFEST_FILENAME = "manifest.json"
+_LOCAL_FFMPEG = "/home/reyerchu/.local/bin/ffmpeg"
+FFMPEG_PATH = os.environ.get("FFMPEG_PATH") or (_LOCAL_FFMPEG if os.path.exists(_LOCAL_FFMPEG) else "ffmpeg")
+
+def get_audio_duration(audio_path: str) -> float:
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", audio_path],
+            capture_output=True, text=True
+        )
+        return float(result.stdout.strip())
+    except:
+        return 0
+
+def parse_silences(ffmpeg_log: str) -> List[Tuple[float, float]]:
+    """解析 silencedetect 輸出的 silence_start / silence_end，回傳 [(起, 訖), ...]"""
+    silences = []
+    start = None
+    for line in ffmpeg_log.splitlines():
+        match = re.search(r'silence_start: (-?[\d.]+)', line)
+        if match:
+            start = max(float(match.group(1)), 0.0)
+            continue
+        match = re.search(r'silence_end: ([\d.]+)', line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+def _silencedetect_cmd(audio_path: str, ffmpeg_path: str) -> List[str]:
+    return [
+        ffmpeg_path, "-nostats", "-i", audio_path, "-vn", "-ac", "1", "-ar", "16000",
+        "-af", f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={SILENCE_MIN_SEC}",
+        "-f", "null", "-"
+    ]
+
+def plan_boundaries(duration: float, silences: List[Tuple[float, float]], target: float, max_duration: float) -> List[float]:
+    """
+    規劃片段切點：從目標長度前後 BOUNDARY_SEARCH_SEC 秒內挑最接近目標的靜音中點
+    找不到靜音時退回目標長度，且任何片段都不超過 max_duration
+    剩餘長度不超過 target + BOUNDARY_SEARCH_SEC（且不超過 max_duration）時不再切割，避免產生過短的尾段
+    """
+    target = min(target, max_duration)
+    last_chunk_max = min(target + BOUNDARY_SEARCH_SEC, max_duration)
+    midpoints = [(start + end) / 2 for start, end in silences]
+    boundaries = []
+    cursor = 0.0
+    while duration - cursor > last_chunk_max:
+        ideal = cursor + target
+        low = max(ideal - BOUNDARY_SEARCH_SEC, cursor + 1)
+        high = min(ideal + BOUNDARY_SEARCH_SEC, cursor + max_duration)
+        candidates = [t for t in midpoints if low <= t <= high]
+        cut = min(candidates, key=lambda t: abs(t - ideal)) if candidates else ideal
+        if duration - cut < 1:
+            break
+        boundaries.append(round(cut, 3))
+        cursor = cut
+    return boundaries
+
+def plan_speech_spans(duration: float, silences: List[Tuple[float, float]],
+                      min_silence: float = STRIP_SILENCE_MIN_SEC, pad: float = STRIP_SILENCE_PAD_SEC) -> List[Tuple[float, float]]:
+    """移除長度超過 min_silence 的靜音後，回傳要保留的原始時間區間 [(起, 訖), ...]"""
+    spans = []
+    cursor = 0.0
+    for start, end in silences:
+        end = min(end, duration)
+        if end - start < min_silence:
+            continue
+        cut_start = start + pad if start > 0 else 0.0
+        cut_end = end - pad if end < duration else duration
+        if cut_start > cursor:
+            spans.append((cursor, cut_start))
+        cursor = max(cursor, cut_end)
+    if cursor < duration:
+        spans.append((cursor, duration))
+    return spans
+
+def build_time_map(spans: List[Tuple[float, float]]) -> List[List[float]]:
+    """時間對照表：每一項為 [移除靜音後的起點, 原始起點, 長度]"""
+    time_map = []
+    position = 0.0
+    for start, end in spans:
+        time_map.append([round(position, 3), round(start, 3), round(end - start, 3)])
+        position += end - start
+    return time_map
+
+def map_time(t: float, time_map: List[List[float]]) -> float:
+    """將移除靜音後的時間換算回原始音訊時間"""
+    idx = max(bisect.bisect_right([piece[0] for piece in time_map], t) - 1, 0)
+    compressed_start, original_start, length = time_map[idx]
+    return round(original_start + min(max(t - compressed_start, 0), length), 3)
+
+def to_compressed_time(t: float, time_map: List[List[float]]) -> Optional[float]:
+    """原始時間換算為移除靜音後的時間；落在被移除的區間時回傳 None"""
+    for compressed_start, original_start, length in time_map:
+        if original_start <= t <= original_start + length:
+            return compressed_start + t - original_start
+    return None
+
+def map_segments(segments: List[Dict[str, Any]], time_map: Optional[List[List[float]]]) -> List[Dict[str, Any]]:
+    if not time_map:
+        return segments
+    return [
+        {**seg, "start": map_time(seg["start"], time_map), "end": map_time(seg["end"], time_map)}
+        for seg in segments
+    ]
+
+def _speech_filter(spans: List[Tuple[float, float]]) -> str:
+    selected = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in spans)
+    return f"aselect='{selected}',asetpts=N/SR/TB"
+
+def _segment_args(boundaries: List[float], chunk_duration: int) -> List[str]:
+    if boundaries:
+        return ["-segment_times", ",".join(f"{t:.3f}" for t in boundaries)]
+    return ["-segment_time", str(chunk_duration)]
+
+def read_segment_list(list_path: str, chunk_dir: str) -> List[Dict[str, Any]]:
+    """讀取 ffmpeg segment muxer 輸出的 CSV 清單（檔名,起始秒數,結束秒數）"""
+    chunks = []
+    if not os.path.exists(list_path):
+        return chunks
+    with open(list_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) < 3:
+                continue
+            chunk_path = os.path.join(chunk_dir, parts[0])
+            if os.path.exists(chunk_path) and os.path.getsize(chunk_path) > 1000:
+                chunks.append({
+                    "path": chunk_path,
+                    "start": float(parts[1]),
+                    "end": float(parts[2])
+                })
+    return chunks
+
+def add_overlap(chunks: List[Dict[str, Any]], overlap_sec: float = CHUNK_OVERLAP_SEC) -> List[Dict[str, Any]]:
+    """
+    以 concat demuxer 串接每段與下一段的開頭 overlap_sec 秒（stream copy，不重新編碼）
+    回傳新的片段清單：end 延伸到重疊結束，keep_start / keep_end 為合併時保留的範圍（重疊區中點）
+    """
+    if overlap_sec <= 0 or len(chunks) < 2:
+        return chunks
+
+    extended = []
+    for i, chunk in enumerate(chunks):
+        keep_start = (chunk["start"] + extended[-1]["end"]) / 2 if extended else chunk["start"]
+        if i == len(chunks) - 1:
+            extended.append({**chunk, "keep_start": keep_start, "keep_end": chunk["end"]})
+            continue
+
+        following = chunks[i + 1]
+        overlap = min(overlap_sec, following["end"] - following["start"])
+        stem, ext = os.path.splitext(chunk["path"])
+        list_path = f"{stem}_overlap.txt"
+        output_path = f"{stem}_overlap{ext}"
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write(f"file '{os.path.abspath(chunk['path'])}'\n")
+            f.write(f"file '{os.path.abspath(following['path'])}'\n")
+            f.write(f"outpoint {overlap:.3f}\n")
+        result = subprocess.run([
+            FFMPEG_PATH, "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", output_path
+        ], capture_output=True)
+        os.remove(list_path)
+
+        if result.returncode != 0 or not os.path.exists(output_path):
+            logging.warning(f"建立重疊片段失敗，片段 {i + 1} 不含重疊")
+            extended.append({**chunk, "keep_start": keep_start, "keep_end": chunk["end"]})
+            continue
+
+        end = chunk["end"] + overlap
+        extended.append({
+            "path": output_path,
+            "start": chunk["start"],
+            "end": end,
+            "keep_start": keep_start,
+            "keep_end": (following["start"] + end) / 2,
+        })
+    return extended
+
+def save_manifest(output_dir: str, prepared: Dict[str, Any]):
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(prepared, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+def load_manifest(output_dir: str) -> Optional[Dict[str, Any]]:
+    """讀取先前的預處理結果；清單不存在或片段檔案缺少時回傳 None"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            prepared = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not prepared.get("chunks") or not all(os.path.exists(chunk["path"]) for chunk in prepared["chunks"]):
+        return None
+    return prepared
+
+def max_chunk_duration(bitrate_kbps: int = AUDIO_BITRATE_KBPS) -> int:
+    """在 API 檔案大小上限內，指定比特率可容納的最長片段秒數（保留 5% 餘裕）"""
+    limit_bits = MAX_FILE_SIZE_MB * 1024 * 1024 * 8 * 0.95
+    return int(limit_bits / (bitrate_kbps * 1000))
+
+async def detect_silences(input_path: str) -> List[Tuple[float, float]]:
+    """以 ffmpeg silencedetect 掃描整段音訊的靜音區間"""
+    process = await asyncio.create_subprocess_exec(
+        *_silencedetect_cmd(input_path, FFMPEG_PATH),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        logging.warning("靜音偵測失敗，改以固定長度切割")
+        return []
+    return parse_silences(stderr.decode("utf-8", errors="replace"))
+
+async def preprocess_audio(input_path: str, output_dir: str, chunk_duration: int = CHUNK_DURATION_SEC,
+                           strip_silence: bool = STRIP_SILENCE) -> Dict[str, Any]:
+    """
+    單次 ffmpeg 解碼，直接輸出符合 API 大小限制的壓縮片段
+    回傳 {"duration": 秒數, "chunks": [{"path", "start", "end"}, ...], "time_map": 時間對照表或 None}
+    strip_silence 時片段不含過長的靜音，片段與轉錄結果的時間軸需以 time_map 換算回原始音訊
+    """
+    duration = await asyncio.to_thread(get_audio_duration, input_path)
+    chunk_duration = min(chunk_duration, max_chunk_duration())
+    os.makedirs(output_dir, exist_ok=True)
+    list_path = os.path.join(output_dir, "segments.csv")
+
+    silences = []
+    if duration > chunk_duration or (strip_silence and duration):
+        silences = await detect_silences(input_path)
+
+    filter_args = []
+    time_map = None
+    speech_duration = duration
+    if strip_silence and silences:
+        spans = plan_speech_spans(duration, silences)
+        speech_duration = sum(end - start for start, end in spans)
+        if spans and speech_duration < duration:
+            time_map = build_time_map(spans)
+            filter_args = ["-af", _speech_filter(spans)]
+            # 切點改在移除靜音後的時間軸上規劃：保留下來的短靜音，以及被移除靜音的接合處
+            silences = [
+                (to_compressed_time(start, time_map), to_compressed_time(end, time_map))
+                for start, end in silences
+            ]
+            silences = [(start, end) for start, end in silences if start is not None and end is not None]
+            silences += [(piece[0], piece[0]) for piece in time_map[1:]]
+            silences.sort()
+            logging.info(f"移除靜音 {duration - speech_duration:.1f} 秒，送出音訊 {speech_duration:.1f} 秒")
+
+    boundaries = []
+    if speech_duration > chunk_duration:
+        boundaries = plan_boundaries(speech_duration, silences, chunk_duration, max_chunk_duration())
+        logging.info(f"偵測到 {len(silences)} 段靜音，規劃切點: {boundaries}")
+
+    cmd = [
+        FFMPEG_PATH, "-y", "-i", input_path,
+        "-vn", *filter_args,
+        "-ar", "16000", "-ac", "1", "-c:a", "libmp3lame", "-b:a", f"{AUDIO_BITRATE_KBPS}k",
+        "-f", "segment", *_segment_args(boundaries, chunk_duration),
+        "-reset_timestamps", "1",
+        "-segment_list", list_path, "-segment_list_type", "csv",
+        os.path.join(output_dir, "chunk_%03d.mp3")
+    ]
+    logging.info(f"執行 ffmpeg 命令: {' '.join(cmd)}")
+
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(stderr.decode("utf-8", errors="replace"))
+
+    chunks = read_segment_list(list_path, output_dir)
+    if not chunks:
+        raise RuntimeError("ffmpeg 未產生任何音訊片段")
+
+    logging.info(f"音訊時長: {duration:.1f}秒，已輸出 {len(chunks)} 個片段（每段約 {chunk_duration} 秒）")
+    prepared = {"duration": duration or chunks[-1]["end"], "chunks": chunks, "time_map": time_map}
+    await asyncio.to_thread(save_manifest, output_dir, prepared)
+    return prepared
@@ -0,0 +1,131 @@
+"""
+Transcription Cache
+以正規化音訊的雜湊值（加上模型與語言）為鍵，保存轉錄結果與摘要
+使用 SQLite 儲存，超過容量上限時依最後存取時間（LRU）淘汰
+另以「extractor:影片 ID」對應到音訊快取鍵，重複的連結不必再下載
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Optional, Dict, Any, List
+
+CACHE_DIR = os.environ.get("S2T_CACHE_DIR", "cache")
+CACHE_MAX_MB = int(os.environ.get("S2T_CACHE_MAX_MB", "500"))
+
+def hash_audio(audio_paths: List[str], model: str, language: Optional[str] = None) -> str:
+    """依序計算各音訊片段內容 + 模型 + 語言的 SHA-256 作為快取鍵"""
+    h = hashlib.sha256()
+    for audio_path in audio_paths:
+        with open(audio_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+    h.update(f"|{model}|{language or 'auto'}".encode("utf-8"))
+    return h.hexdigest()
+
+class TranscriptCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, max_mb: int = CACHE_MAX_MB):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "transcripts.db")
+        self.max_bytes = max_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcripts (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                summary TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS links (
+                link_key TEXT PRIMARY KEY,
+                audio_key TEXT NOT NULL,
+                title TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        logging.info(f"轉錄快取已啟用: {self.db_path}（上限 {max_mb} MB）")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """取得快取的轉錄結果與摘要，未命中時回傳 None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT result, summary FROM transcripts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE transcripts SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+        return {"result": json.loads(row[0]), "summary": row[1]}
+
+    def put(self, key: str, result: Dict[str, Any], summary: Optional[str] = None):
+        data = json.dumps(result, ensure_ascii=False)
+        size = len(data.encode("utf-8")) + len((summary or "").encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO transcripts (key, result, summary, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, data, summary, size, now, now)
+            )
+            self.conn.commit()
+            self._evict()
+
+    def set_summary(self, key: str, summary: str):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE transcripts SET summary = ?, size = size + ? WHERE key = ?",
+                (summary, len(summary.encode("utf-8")), key)
+            )
+            self.conn.commit()
+
+    def get_link(self, link_key: str) -> Optional[Dict[str, Any]]:
+        """以影片 ID 查詢快取，回傳標題、音訊快取鍵及轉錄結果"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT audio_key, title FROM links WHERE link_key = ?", (link_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        cached = self.get(row[0])
+        if cached is None:
+            return None
+        return {"audio_key": row[0], "title": row[1], **cached}
+
+    def put_link(self, link_key: str, audio_key: str, title: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO links (link_key, audio_key, title, created_at) VALUES (?, ?, ?, ?)",
+                (link_key, audio_key, title, time.time())
+            )
+            self.conn.commit()
+
+    def _evict(self):
+        """總容量超過上限時，刪除最久未使用的項目"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT key, size FROM transcripts ORDER BY accessed_at ASC").fetchall()
+        removed = 0
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+            self.conn.execute("DELETE FROM links WHERE audio_key = ?", (key,))
+            total -= size
+            removed += 1
+        self.conn.commit()
+        logging.info(f"快取容量超過上限，已淘汰 {removed} 筆")
+
+
+transcript_cache = TranscriptCache()
@@ -3,257 +3,533 @@ Groq API Service for Speech-to-Text
 支援多 API Key 輪替，突破速率限制
 """
 import os
-import subprocess
-import tempfile
+import json
 import asyncio
 import time
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
 
 env_path = Path(__file__).parent / ".env"
 load_dotenv(env_path)
 import logging
-from groq import Groq
-from typing import Optional, Dict, Any, List
+from groq import AsyncGroq
+from typing import Optional, Dict, Any, List, Callable
 from opencc import OpenCC
 import re
+from difflib import SequenceMatcher
+from app.audio import CHUNK_OVERLAP_SEC, add_overlap
+from app.key_pool import KeyPool, KeyLease, MIN_BILLED_AUDIO_SEC
+from app.local_engine import local_engine
 
 # 支援多個 API Key（逗號分隔）
 GROQ_API_KEYS_STR = os.environ.get("GROQ_API_KEY", "")
 GROQ_API_KEYS = [k.strip() for k in GROQ_API_KEYS_STR.split(",") if k.strip()]
 
-MAX_FILE_SIZE_MB = 24
-CHUNK_DURATION_SEC = 600
+# 429 回應未附等待時間時的預設冷卻秒數
+DEFAULT_RATE_LIMIT_WAIT = 65
+# 重疊區內兩段文字相似度達此值即視為重複
+DUPLICATE_SIMILARITY = 0.6
+# 每批翻譯的輸入 tokens 上限（粗估一字元一 token）
+TRANSLATION_BATCH_TOKENS = int(os.environ.get("GROQ_TRANSLATION_BATCH_TOKENS", "1500"))
+# 片段用盡重試次數後，再重新排入佇列的輪數與第一輪等待秒數（之後每輪加倍）
+CHUNK_RETRY_ROUNDS = int(os.environ.get("GROQ_CHUNK_RETRY_ROUNDS", "3"))
+CHUNK_RETRY_BACKOFF_SEC = 30
+# 翻譯失敗或缺漏的 segments 重新分批翻譯的總嘗試次數
+TRANSLATION_ATTEMPTS = 2
+# 所有 Key 都需要等待、且等待時間超過本地推論的預估時間時，改由本地 Whisper 轉錄該片段
+LOCAL_FALLBACK = os.environ.get("S2T_LOCAL_FALLBACK", "0") == "1"
+# 摘要每個視窗的輸入字元上限（約 2000 tokens，避免超過 LLM 限制）
+SUMMARY_WINDOW_CHARS = 6000
 
-cc = OpenCC('s2twp')
+SUMMARY_PROMPT = """你是專業的內容摘要專家。請為以下內容生成一個簡潔有力的摘要。
+
+要求：
+1. 使用繁體中文
+2. 摘要長度約 200-500 字
+3. 包含主要重點和關鍵資訊
+4. 使用條列式格式便於閱讀
+5. 開頭先用一句話概述主題
+
+格式：
+## 內容摘要
+
+**主題概述**：[一句話概述]
+
+**重點摘要**：
+• [重點1]
+• [重點2]
+• [重點3]
+..."""
+
+PARTIAL_SUMMARY_PROMPT = """你是專業的內容摘要專家。以下是一份長篇逐字稿中的一個段落，請以繁體中文條列此段落的主要重點與關鍵資訊（約 100-300 字）。
+只輸出條列重點，不要加標題或開場白。"""
+
+_opencc_local = threading.local()
+
+def _thread_converter() -> OpenCC:
+    """每個執行緒各自持有一個 OpenCC 實例，不共用同一個轉換器"""
+    converter = getattr(_opencc_local, "converter", None)
+    if converter is None:
+        converter = _opencc_local.converter = OpenCC('s2twp')
+    return converter
+
+def convert_lines(lines: List[str]) -> List[str]:
+    """以換行串接後一次轉換成繁體中文，再依換行拆回各行"""
+    if not lines:
+        return []
+    if any("\n" in line for line in lines):
+        lines = [line.replace("\n", " ") for line in lines]
+    converted = _thread_converter().convert("\n".join(lines)).split("\n")
+    if len(converted) != len(lines):
+        return [_thread_converter().convert(line) for line in lines]
+    return converted
+
+async def convert_lines_async(lines: List[str]) -> List[str]:
+    """在執行緒中轉換一個片段的 segments，不阻塞事件迴圈（基準測試見 benchmarks/bench_opencc.py）"""
+    if not lines:
+        return []
+    return await asyncio.to_thread(convert_lines, lines)
 
 def is_chinese(text):
     return bool(re.search(r'[\u4e00-\u9fff]', text))
 
-def get_audio_duration(audio_path: str) -> float:
+def is_rate_limit_error(error_str: str) -> bool:
+    return "429" in error_str or "rate_limit" in error_str.lower()
+
+def join_segments(segments: List[Dict[str, Any]]) -> str:
+    """由 segments 組成全文（Whisper 的英文 segment 自帶前導空白）"""
+    return "".join(seg["text"] for seg in segments).strip()
+
+def trim_to_window(result: Dict[str, Any], keep_start: float, keep_end: float) -> Dict[str, Any]:
+    """重疊模式下只保留中點落在 [keep_start, keep_end) 的 segments"""
+    segments = [
+        seg for seg in result["segments"]
+        if keep_start <= (seg["start"] + seg["end"]) / 2 < keep_end
+    ]
+    return {**result, "text": join_segments(segments), "segments": segments}
+
+def checkpoint_path(checkpoint_dir: str, index: int) -> str:
+    return os.path.join(checkpoint_dir, f"chunk_{index:03d}.json")
+
+def load_checkpoint(checkpoint_dir: Optional[str], index: int) -> Optional[Dict[str, Any]]:
+    """讀取已完成片段的轉錄結果，沒有或損壞時回傳 None"""
+    if not checkpoint_dir:
+        return None
     try:
-        result = subprocess.run(
-            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-             "-of", "default=noprint_wrappers=1:nokey=1", audio_path],
-            capture_output=True, text=True
-        )
-        return float(result.stdout.strip())
-    except:
-        return 0
+        with open(checkpoint_path(checkpoint_dir, index), "r", encoding="utf-8") as f:
+            result = json.load(f)
+        return result if result.get("success") else None
+    except (OSError, ValueError):
+        return None
 
-def split_audio(audio_path: str, chunk_duration: int = CHUNK_DURATION_SEC) -> List[str]:
-    duration = get_audio_duration(audio_path)
-    if duration == 0:
-        return [audio_path]
-    
-    chunks = []
-    temp_dir = tempfile.mkdtemp()
-    num_chunks = int(duration / chunk_duration) + 1
-    
-    logging.info(f"音訊時長: {duration:.1f}秒，分割成 {num_chunks} 個片段")
-    
-    for i in range(num_chunks):
-        start_time = i * chunk_duration
-        chunk_path = os.path.join(temp_dir, f"chunk_{i:03d}.wav")
-        
-        subprocess.run([
-            "ffmpeg", "-y", "-i", audio_path,
-            "-ss", str(start_time), "-t", str(chunk_duration),
-            "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le",
-            chunk_path
-        ], capture_output=True)
-        
-        if os.path.exists(chunk_path) and os.path.getsize(chunk_path) > 1000:
-            chunks.append(chunk_path)
-            logging.info(f"已建立片段 {i+1}/{num_chunks}")
-    
-    return chunks if chunks else [audio_path]
+def save_checkpoint(checkpoint_dir: str, index: int, result: Dict[str, Any]):
+    """先寫入暫存檔再改名，避免中斷時留下不完整的檔案"""
+    path = checkpoint_path(checkpoint_dir, index)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+def pack_translation_batches(segments: List[Dict[str, Any]], max_tokens: int = TRANSLATION_BATCH_TOKENS) -> List[List[int]]:
+    """將 segments 依 tokens 上限分批，回傳每批的 segment 索引（作為翻譯時對齊用的 ID）"""
+    batches = []
+    current = []
+    current_tokens = 0
+    for idx, seg in enumerate(segments):
+        tokens = len(seg["text"]) + 8
+        if current and current_tokens + tokens > max_tokens:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(idx)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def split_text_windows(text: str, max_chars: int = SUMMARY_WINDOW_CHARS) -> List[str]:
+    """將長文切成不超過 max_chars 的視窗，盡量在句尾或空白處斷開"""
+    windows = []
+    while len(text) > max_chars:
+        cut = max(text.rfind(mark, 0, max_chars) for mark in ("。", "！", "？", ". ", "\n", " "))
+        cut = cut + 1 if cut > max_chars // 2 else max_chars
+        windows.append(text[:cut].strip())
+        text = text[cut:]
+    if text.strip():
+        windows.append(text.strip())
+    return windows
+
+def parse_translation_lines(output: str) -> Dict[int, str]:
+    """解析「[ID] 譯文」格式的翻譯輸出"""
+    translated = {}
+    for line in output.splitlines():
+        match = re.match(r'\s*\[(\d+)\]\s*(.*)$', line)
+        if match and match.group(2).strip():
+            translated[int(match.group(1))] = match.group(2).strip()
+    return translated
+
+def drop_seam_duplicates(previous: List[Dict[str, Any]], following: List[Dict[str, Any]], seam: float) -> List[Dict[str, Any]]:
+    """移除接縫附近與前一片段重複的 segments（跨越中點、兩邊各保留一次的句子）"""
+    tail = [seg for seg in previous if seg["end"] > seam - 1]
+    kept = []
+    for seg in following:
+        if seg["start"] < seam + 1 and any(
+            seg["start"] < other["end"] and other["start"] < seg["end"]
+            and SequenceMatcher(None, seg["text"].strip(), other["text"].strip()).ratio() >= DUPLICATE_SIMILARITY
+            for other in tail
+        ):
+            logging.info(f"移除重疊區重複段落: {seg['text'].strip()}")
+            continue
+        kept.append(seg)
+    return kept
+
+RATE_LIMIT_UNITS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+def parse_rate_limit_wait(error_str: str) -> float:
+    """解析 429 錯誤中的「try again in 1h2m3.4s」、「1m23.4s」或「350ms」，回傳需要等待的秒數"""
+    match = re.search(r'try again in ((?:[\d.]+(?:ms|h|m|s))+)', error_str)
+    if match:
+        parts = re.findall(r'([\d.]+)(ms|h|m|s)', match.group(1))
+        return sum(float(value) * RATE_LIMIT_UNITS[unit] for value, unit in parts) + 1
+    return DEFAULT_RATE_LIMIT_WAIT
 
 class GroqService:
     def __init__(self):
         self.clients = []
-        self.current_client_idx = 0
+        self.pool = KeyPool([])
         self.whisper_model = "whisper-large-v3"
         self.llm_model = "llama-3.3-70b-versatile"
         
         if GROQ_API_KEYS:
             for i, key in enumerate(GROQ_API_KEYS):
-                self.clients.append(Groq(api_key=key))
+                self.clients.append(AsyncGroq(api_key=key))
+            self.pool = KeyPool(self.clients)
             logging.info(f"Groq 服務已初始化，共 {len(self.clients)} 個 API Key（每小時上限 {len(self.clients) * 2} 小時音訊）")
         else:
             logging.warning("未設定 GROQ_API_KEY")
     
-    @property
-    def client(self):
-        if not self.clients:
-            return None
-        return self.clients[self.current_client_idx]
-    
-    def switch_to_next_client(self):
-        """切換到下一個 API Key"""
-        if len(self.clients) > 1:
-            old_idx = self.current_client_idx
-            self.current_client_idx = (self.current_client_idx + 1) % len(self.clients)
-            logging.info(f"切換 API Key: {old_idx + 1} -> {self.current_client_idx + 1}")
-            return True
-        return False
-    
     def is_available(self) -> bool:
         return len(self.clients) > 0
     
-    def to_traditional(self, text: str) -> str:
-        if not text:
-            return text
-        return cc.convert(text)
+    # ---- 非同步 API 呼叫層：所有 Groq 請求都經由以下方法，不會阻塞事件迴圈 ----
+    # 每次呼叫向 KeyPool 租用一個 Key，不共用任何「目前 Key」的全域狀態
     
-    async def translate_to_chinese(self, text: str) -> str:
-        if not self.client or not text.strip():
-            return text
+    async def _create_transcription(self, lease: KeyLease, audio_path: str, language: str):
+        """以租用的 Key 呼叫 Whisper API"""
+        audio_bytes = await asyncio.to_thread(Path(audio_path).read_bytes)
+        return await lease.client.audio.transcriptions.create(
+            file=(os.path.basename(audio_path), audio_bytes),
+            model=self.whisper_model,
+            response_format="verbose_json",
+            language=language,
+            temperature=0.0
+        )
+    
+    async def _chat_completion(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int, max_retries: int = 3) -> str:
+        """以剩餘 token 額度最多的 Key 呼叫 LLM 並回傳輸出文字；429 時冷卻該 Key 並改用其他 Key"""
+        # 粗估 tokens：輸入字元數（中文約一字一 token）加上輸出上限
+        estimated_tokens = sum(len(m["content"]) for m in messages) + max_tokens
+        
+        for attempt in range(max_retries):
+            async with self.pool.lease(tokens=estimated_tokens) as lease:
+                try:
+                    response = await lease.client.chat.completions.create(
+                        model=self.llm_model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens
+                    )
+                except Exception as e:
+                    lease.billed = False
+                    error_str = str(e)
+                    if not is_rate_limit_error(error_str) or attempt == max_retries - 1:
+                        raise
+                    self.pool.cooldown(lease.idx, parse_rate_limit_wait(error_str))
+                    continue
+                
+                # 以實際用量取代預估值
+                usage = getattr(response, "usage", None)
+                self.pool.budget.release(lease.idx, lease.reservation)
+                self.pool.budget.reserve(lease.idx, tokens=getattr(usage, "total_tokens", None) or estimated_tokens)
+                return response.choices[0].message.content.strip()
+    
+    async def _translate_batch(self, segments: List[Dict[str, Any]], batch: List[int]) -> Dict[int, str]:
+        """翻譯一批 segments，回傳 {ID: 譯文}；失敗或缺漏的 ID 由呼叫端保留原文"""
+        lines = "\n".join(f"[{idx}] {segments[idx]['text'].strip()}" for idx in batch)
         try:
-            response = self.client.chat.completions.create(
-                model=self.llm_model,
+            output = await self._chat_completion(
                 messages=[
-                    {"role": "system", "content": "你是專業翻譯。將以下文字翻譯成台灣繁體中文。只輸出翻譯結果。"},
-                    {"role": "user", "content": text}
+                    {"role": "system", "content": "你是專業翻譯。將每一行翻譯成台灣繁體中文，保留行首的 [編號]，一行輸入對應一行輸出，不要合併或拆分行。只輸出翻譯結果。"},
+                    {"role": "user", "content": lines}
                 ],
                 temperature=0.1,
-                max_tokens=4096
+                max_tokens=min(len(lines) * 2 + 256, 4096)
             )
-            return response.choices[0].message.content.strip()
         except Exception as e:
             logging.error(f"翻譯失敗: {str(e)}")
-            return text
+            return {}
+        translated = parse_translation_lines(output)
+        missing = [idx for idx in batch if idx not in translated]
+        if missing:
+            logging.warning(f"翻譯結果缺少 {len(missing)} 段，保留原文")
+        ids = [idx for idx in translated if idx in batch]
+        return dict(zip(ids, await convert_lines_async([translated[idx] for idx in ids])))
+    
+    async def translate_segments(self, segments: List[Dict[str, Any]], ids: Optional[List[int]] = None) -> tuple:
+        """
+        將 segments 分批翻譯成繁體中文（各批並行、分散到各 Key），保留原本的時間軸
+        ids 指定只翻譯其中部分 segments（預設全部）；失敗或缺漏的 segments 會重新分批再試
+        回傳 (翻譯後的 segments, 仍未翻譯的 ID)
+        """
+        pending = list(range(len(segments))) if ids is None else list(ids)
+        if not self.clients or not pending:
+            return segments, pending
+        translated = {}
+        for attempt in range(TRANSLATION_ATTEMPTS):
+            batches = [[pending[pos] for pos in batch] for batch in pack_translation_batches([segments[idx] for idx in pending])]
+            logging.info(f"翻譯 {len(pending)} 段文字，共 {len(batches)} 批（第 {attempt + 1}/{TRANSLATION_ATTEMPTS} 次）")
+            results = await asyncio.gather(*(self._translate_batch(segments, batch) for batch in batches))
+            for result in results:
+                translated.update(result)
+            pending = [idx for idx in pending if idx not in translated]
+            if not pending:
+                break
+        if pending:
+            logging.warning(f"{len(pending)} 段文字翻譯失敗，保留原文並標記為未翻譯")
+        segments = [
+            {**seg, "text": translated.get(idx, seg["text"])}
+            for idx, seg in enumerate(segments)
+        ]
+        return segments, pending
+    
+    async def _chunk_result(self, segments: List[Dict[str, Any]], detected_lang: str, original_text: str) -> Dict[str, Any]:
+        """將片段的 segments 整理為統一的結果格式（Groq 與本地引擎共用）"""
+        # 非中文的片段於轉錄後另行翻譯（見 translate_segments），此處不佔用轉錄的 Key
+        is_zh = detected_lang in ["zh", "chinese"] or is_chinese(original_text)
+        
+        # 繁體轉換只在 segment 層級做一次（整批一次呼叫 OpenCC），全文由 segments 組成
+        to_convert = [idx for idx, seg in enumerate(segments) if is_zh or is_chinese(seg["text"])]
+        converted = await convert_lines_async([segments[idx]["text"] for idx in to_convert])
+        for idx, text in zip(to_convert, converted):
+            segments[idx]["text"] = text
+        
+        return {
+            "text": join_segments(segments),
+            "language": detected_lang,
+            "segments": segments,
+            "needs_translation": not is_zh,
+            "success": True
+        }
+    
+    async def _transcribe_locally_if_faster(self, audio_path: str, language: str, time_offset: float, duration: float,
+                                            billed_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        依各 Key 的冷卻與額度估計 Groq 的等待時間，比本地推論的預估時間長時改用本地 Whisper 轉錄
+        不需改用本地或本地轉錄失敗時回傳 None，由呼叫端繼續使用 Groq
+        """
+        groq_wait = self.pool.estimated_wait(audio_seconds=billed_seconds)
+        local_estimate = local_engine.estimate_seconds(duration)
+        if not duration or groq_wait <= local_estimate:
+            return None
+        
+        logging.info(f"Groq 預估需等待 {groq_wait:.0f} 秒，本地轉錄預估 {local_estimate:.0f} 秒，改用本地 Whisper")
+        try:
+            local = await local_engine.transcribe_chunk(
+                {"path": audio_path, "start": time_offset, "end": time_offset + duration}, language
+            )
+        except Exception as e:
+            logging.error(f"本地轉錄錯誤: {e}")
+            return None
+        return await self._chunk_result(local["segments"], local["language"], local["text"])
     
-    async def transcribe_chunk_with_retry(self, audio_path: str, language: str, time_offset: float, max_retries: int = 10) -> Dict[str, Any]:
-        """轉錄單個片段，含多 Key 輪替和重試邏輯"""
+    async def transcribe_chunk_with_retry(self, audio_path: str, language: str, time_offset: float, duration: float = 0, max_retries: int = 10) -> Dict[str, Any]:
+        """轉錄單個片段：向 KeyPool 租用額度最多的 Key，含重試邏輯"""
         last_error = None
-        keys_tried = set()
+        billed_seconds = max(duration, MIN_BILLED_AUDIO_SEC)
         
         for attempt in range(max_retries):
+            backoff = False
+            if LOCAL_FALLBACK:
+                result = await self._transcribe_locally_if_faster(audio_path, language, time_offset, duration, billed_seconds)
+                if result:
+                    return result
+            
+            # 沒有可用 Key 時，acquire 會等到最早冷卻結束或額度釋出的 Key
+            lease = await self.pool.acquire(audio_seconds=billed_seconds)
+            logging.info(f"轉錄片段 (使用 Key {lease.idx + 1}/{len(self.clients)})")
             try:
-                with open(audio_path, "rb") as audio_file:
-                    transcription = self.client.audio.transcriptions.create(
-                        file=(os.path.basename(audio_path), audio_file.read()),
-                        model=self.whisper_model,
-                        response_format="verbose_json",
-                        language=language,
-                        temperature=0.0
-                    )
+                transcription = await self._create_transcription(lease, audio_path, language)
                 
                 detected_lang = getattr(transcription, "language", "unknown")
                 original_text = transcription.text
                 
-                if detected_lang in ["zh", "chinese"] or is_chinese(original_text):
-                    processed_text = self.to_traditional(original_text)
-                else:
-                    processed_text = await self.translate_to_chinese(original_text)
-                
-                segments = []
                 if hasattr(transcription, "segments") and transcription.segments:
-                    for seg in transcription.segments:
-                        seg_text = seg.get("text", "")
-                        if detected_lang in ["zh", "chinese"] or is_chinese(seg_text):
-                            processed_seg = self.to_traditional(seg_text)
-                        else:
-                            processed_seg = seg_text
-                        
-                        segments.append({
-                            "start": seg.get("start", 0) + time_offset,
-                            "end": seg.get("end", 0) + time_offset,
-                            "text": processed_seg
-                        })
+                    segments = [{
+                        "start": seg.get("start", 0) + time_offset,
+                        "end": seg.get("end", 0) + time_offset,
+                        "text": seg.get("text", "")
+                    } for seg in transcription.segments]
                 else:
                     segments = [{
                         "start": time_offset,
                         "end": time_offset + getattr(transcription, "duration", 0),
-                        "text": processed_text
+                        "text": original_text
                     }]
                 
-                return {
-                    "text": processed_text,
-                    "language": detected_lang,
-                    "segments": segments,
-                    "success": True
-                }
+                return await self._chunk_result(segments, detected_lang, original_text)
                 
             except Exception as e:
                 last_error = e
                 error_str = str(e)
+                lease.billed = False
                 
-                if "429" in error_str or "rate_limit" in error_str.lower():
-                    keys_tried.add(self.current_client_idx)
-                    
-                    # 嘗試切換到其他 Key
-                    if self.switch_to_next_client():
-                        if self.current_client_idx not in keys_tried:
-                            logging.info(f"使用新 API Key 重試...")
-                            continue
-                    
-                    # 所有 Key 都試過了，需要等待
-                    wait_time = 65
-                    match = re.search(r'try again in (\d+)m([\d.]+)s', error_str)
-                    if match:
-                        wait_time = int(match.group(1)) * 60 + float(match.group(2)) + 10
-                    
-                    logging.warning(f"所有 API Key 都達到限制，等待 {wait_time:.0f} 秒")
-                    keys_tried.clear()  # 重置，下一輪重新嘗試所有 key
-                    await asyncio.sleep(wait_time)
+                if is_rate_limit_error(error_str):
+                    # 此 Key 冷卻到 API 指定的時間，期間其他請求也不會再租用它
+                    self.pool.cooldown(lease.idx, parse_rate_limit_wait(error_str))
                 else:
                     logging.error(f"轉錄錯誤: {error_str}")
-                    await asyncio.sleep(10)
+                    backoff = True
+            finally:
+                await self.pool.release(lease)
+            
+            if backoff:
+                # 先歸還 Key 再等待，不佔用該 Key 的並行名額
+                await asyncio.sleep(10)
         
         logging.error(f"片段轉錄失敗: {last_error}")
         return {"text": "", "language": "unknown", "segments": [], "success": False}
     
-    async def transcribe(self, audio_path: str, language: str = None) -> Dict[str, Any]:
+    async def _transcribe_chunks_concurrently(self, chunks: List[Dict[str, Any]], language: str, on_chunk: Optional[Callable] = None,
+                                              checkpoint_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        並行轉錄所有片段（各自挑選額度最多的 Key），回傳結果依原片段順序排列
+        非中文片段轉錄完成後立即進入翻譯階段，與其他片段的轉錄同時進行
+        指定 checkpoint_dir 時，完成的片段結果會寫入磁碟，再次執行時直接沿用，只送出缺少的片段
+        """
+        async def transcribe_once(chunk: Dict[str, Any]) -> Dict[str, Any]:
+            duration = max(chunk["end"] - chunk["start"], 0)
+            result = await self.transcribe_chunk_with_retry(chunk["path"], language, chunk["start"], duration)
+            
+            if result["success"] and "keep_start" in chunk:
+                result = trim_to_window(result, chunk["keep_start"], chunk["keep_end"])
+            
+            if result.pop("needs_translation", False):
+                result = await translate_result(result)
+            return result
+        
+        async def translate_result(result: Dict[str, Any], ids: Optional[List[int]] = None) -> Dict[str, Any]:
+            segments, untranslated = await self.translate_segments(result["segments"], ids)
+            # 全文由翻譯後的 segments 組成，與字幕內容一致；未翻譯的 ID 記錄在結果中，之後再補翻譯
+            result = {**result, "segments": segments, "text": join_segments(segments)}
+            result.pop("untranslated_ids", None)
+            if untranslated:
+                result["untranslated_ids"] = untranslated
+            return result
+        
+        async def run_chunk(i: int, chunk: Dict[str, Any]) -> Dict[str, Any]:
+            result = await asyncio.to_thread(load_checkpoint, checkpoint_dir, i)
+            if result:
+                logging.info(f"片段 {i+1}/{len(chunks)} 已有轉錄結果，略過")
+                if result.get("untranslated_ids"):
+                    # 先前翻譯失敗的 segments 只補翻譯，不重新轉錄
+                    result = await translate_result(result, result["untranslated_ids"])
+                    await asyncio.to_thread(save_checkpoint, checkpoint_dir, i, result)
+            else:
+                logging.info(f"處理片段 {i+1}/{len(chunks)}")
+                result = await transcribe_once(chunk)
+                # 失敗的片段重新排入佇列，等待時間逐輪加倍，不影響其他片段進行
+                for retry_round in range(CHUNK_RETRY_ROUNDS):
+                    if result["success"]:
+                        break
+                    wait_time = CHUNK_RETRY_BACKOFF_SEC * 2 ** retry_round
+                    logging.warning(f"片段 {i+1} 失敗，{wait_time} 秒後重試（第 {retry_round + 1}/{CHUNK_RETRY_ROUNDS} 輪）")
+                    await asyncio.sleep(wait_time)
+                    result = await transcribe_once(chunk)
+                if result["success"] and checkpoint_dir:
+                    await asyncio.to_thread(save_checkpoint, checkpoint_dir, i, result)
+            
+            if result["success"]:
+                logging.info(f"片段 {i+1} 完成")
+                if on_chunk:
+                    on_chunk(i, len(chunks), result)
+            else:
+                logging.warning(f"片段 {i+1} 失敗")
+            return result
+        
+        return await asyncio.gather(*(run_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+    
+    async def transcribe_chunks(self, chunks: List[Dict[str, Any]], language: str = None, on_chunk: Optional[Callable] = None, overlap: float = CHUNK_OVERLAP_SEC,
+                                checkpoint_dir: Optional[str] = None) -> Dict[str, Any]:
+        """
+        並行轉錄已切割好的片段（{"path", "start", "end"}），依片段順序重組結果
+        overlap > 0 時每段附上下一段開頭的音訊，合併時以重疊區中點及文字相似度去除重複
+        重試後仍失敗的片段列在 failed_chunks，翻譯未完成的片段列在 untranslated_chunks
+        兩者都可稍後以相同 checkpoint_dir 重新執行補齊
+        """
         if not self.clients:
             raise ValueError("Groq 服務未初始化")
         
-        file_size_mb = os.path.getsize(audio_path) / (1024 * 1024)
-        logging.info(f"音訊檔案大小: {file_size_mb:.2f} MB")
+        extended = await asyncio.to_thread(add_overlap, chunks, overlap)
+        try:
+            results = await self._transcribe_chunks_concurrently(extended, language, on_chunk, checkpoint_dir)
+        finally:
+            for chunk, original in zip(extended, chunks):
+                if chunk["path"] != original["path"]:
+                    try:
+                        os.remove(chunk["path"])
+                    except:
+                        pass
         
-        if file_size_mb > MAX_FILE_SIZE_MB:
-            logging.info(f"檔案超過 {MAX_FILE_SIZE_MB} MB，進行分割處理")
-            chunks = split_audio(audio_path)
-            
-            all_text = []
-            all_segments = []
-            detected_lang = "unknown"
-            
-            for i, chunk_path in enumerate(chunks):
-                time_offset = i * CHUNK_DURATION_SEC
-                logging.info(f"處理片段 {i+1}/{len(chunks)} (使用 Key {self.current_client_idx + 1}/{len(self.clients)})")
-                
-                result = await self.transcribe_chunk_with_retry(chunk_path, language, time_offset)
-                
-                if result["success"]:
-                    all_text.append(result["text"])
-                    all_segments.extend(result["segments"])
-                    detected_lang = result["language"]
-                    logging.info(f"片段 {i+1} 完成")
-                else:
-                    logging.warning(f"片段 {i+1} 失敗")
-                
-                try:
-                    os.remove(chunk_path)
-                except:
-                    pass
-            
-            return {
-                "text": " ".join(all_text),
-                "language": detected_lang,
-                "segments": all_segments
-            }
-        else:
-            result = await self.transcribe_chunk_with_retry(audio_path, language, 0)
-            return {
-                "text": result["text"],
-                "language": result["language"],
-                "segments": result["segments"]
-            }
+        all_segments = []
+        failed_chunks = []
+        untranslated_chunks = []
+        detected_lang = "unknown"
+        
+        # 依片段順序重組結果
+        for i, (chunk, result) in enumerate(zip(extended, results)):
+            if result["success"]:
+                segments = result["segments"]
+                if all_segments and "keep_start" in chunk:
+                    segments = drop_seam_duplicates(all_segments, segments, chunk["keep_start"])
+                all_segments.extend(segments)
+                detected_lang = result["language"]
+                if result.get("untranslated_ids"):
+                    untranslated_chunks.append(i)
+            else:
+                failed_chunks.append({"index": i, "start": chunks[i]["start"], "end": chunks[i]["end"]})
+        
+        if failed_chunks:
+            logging.error(f"{len(failed_chunks)} 個片段轉錄失敗: {[chunk['index'] + 1 for chunk in failed_chunks]}")
+        
+        return {
+            # 全文由去除接縫重複後的 segments 組成，與字幕內容一致
+            "text": join_segments(all_segments),
+            "language": detected_lang,
+            "segments": all_segments,
+            "failed_chunks": failed_chunks,
+            "untranslated_chunks": untranslated_chunks
+        }
+    
+    async def _summarize_window(self, text: str) -> str:
+        """map 階段：摘要單一視窗，失敗時回傳空字串（不影響其他視窗）"""
+        try:
+            return await self._chat_completion(
+                messages=[
+                    {"role": "system", "content": PARTIAL_SUMMARY_PROMPT},
+                    {"role": "user", "content": text}
+                ],
+                temperature=0.3,
+                max_tokens=512
+            )
+        except Exception as e:
+            logging.error(f"段落摘要失敗: {str(e)}")
+            return ""
     
     async def summarize(self, text: str, max_length: int = 500) -> str:
-        """使用 LLM 生成文字摘要"""
+        """
+        使用 LLM 生成文字摘要
+        超過單一視窗的長文採 map-reduce：各視窗並行摘要（分散到各 Key），再將段落重點合併成最終摘要
+        """
         if not self.clients or not text.strip():
             return ""
         
@@ -264,42 +540,28 @@ class GroqService:
         try:
             logging.info("使用 LLM 生成摘要...")
             
-            # 如果文字太長，截取前面部分
-            max_input = 6000  # 約 2000 tokens，避免超過 LLM 限制
-            input_text = text[:max_input] if len(text) > max_input else text
+            # 段落重點仍超過單一視窗時再摘要一層，直到能一次放入
+            input_text = text
+            level = 0
+            while len(input_text) > SUMMARY_WINDOW_CHARS:
+                windows = split_text_windows(input_text)
+                level += 1
+                logging.info(f"摘要第 {level} 層：{len(windows)} 個視窗並行處理")
+                partials = await asyncio.gather(*(self._summarize_window(window) for window in windows))
+                partials = [partial for partial in partials if partial.strip()]
+                if not partials:
+                    return ""
+                input_text = "\n\n".join(f"【第 {i + 1} 段】\n{partial}" for i, partial in enumerate(partials))
             
-            response = self.client.chat.completions.create(
-                model=self.llm_model,
+            summary = await self._chat_completion(
                 messages=[
-                    {
-                        "role": "system",
-                        "content": """你是專業的內容摘要專家。請為以下內容生成一個簡潔有力的摘要。
-
-要求：
-1. 使用繁體中文
-2. 摘要長度約 200-500 字
-3. 包含主要重點和關鍵資訊
-4. 使用條列式格式便於閱讀
-5. 開頭先用一句話概述主題
-
-格式：
-## 內容摘要
-
-**主題概述**：[一句話概述]
-
-**重點摘要**：
-• [重點1]
-• [重點2]
-• [重點3]
-..."""
-                    },
+                    {"role": "system", "content": SUMMARY_PROMPT},
                     {"role": "user", "content": input_text}
                 ],
                 temperature=0.3,
                 max_tokens=1024
             )
             
-            summary = response.choices[0].message.content.strip()
             logging.info(f"摘要生成完成，長度：{len(summary)} 字")
             return summary
             
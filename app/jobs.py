@@ -0,0 +1,343 @@
+"""
+Job Queue
+非同步轉錄工作：提交後立即回傳 job ID，由固定數量的 worker 執行
+工作狀態保存在 SQLite，並同步寫入各工作目錄 temp/<job_id>/job.json
+服務重啟後未完成的工作會重新排入佇列，沿用工作目錄中的片段與檢查點，從上次完成的片段繼續
+執行中的各階段事件（下載、ffmpeg、片段完成、摘要、ZIP）可透過 subscribe 即時串流
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Awaitable, AsyncIterator
+
+JOBS_DIR = os.environ.get("S2T_JOBS_DIR", "jobs")
+JOB_WORKERS = int(os.environ.get("S2T_JOB_WORKERS", "2"))
+# 工作目錄（與轉錄服務的 temp/<session_id> 相同）
+SESSIONS_DIR = "temp"
+SESSION_STATE_FILENAME = "job.json"
+
+# 工作狀態
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# SSE 連線閒置多久送出一次心跳（秒）
+HEARTBEAT_SEC = 15
+
+class JobManager:
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: int = JOB_WORKERS):
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.db_path = os.path.join(jobs_dir, "jobs.db")
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                partial TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.runner: Optional[Callable[..., Awaitable[Dict[str, Any]]]] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.running: Dict[str, asyncio.Task] = {}
+        # 由同步端點直接執行的工作（不在 worker 中，無法取消）
+        self.tracked = set()
+        self.partials: Dict[str, Dict[str, Any]] = {}
+        self.events: Dict[str, List[Dict[str, Any]]] = {}
+        self.subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def set_runner(self, runner: Callable[..., Awaitable[Dict[str, Any]]]):
+        """設定執行工作的函式：runner(job, on_event) -> 結果，on_event(stage, data) 回報進度"""
+        self.runner = runner
+
+    async def start(self):
+        """啟動 worker，並將上次未完成的工作（含只記錄在工作目錄中的工作）重新排入佇列"""
+        self.queue = asyncio.Queue()
+        await asyncio.to_thread(self._restore_sessions)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at ASC", (QUEUED, RUNNING)
+            ).fetchall()
+        for (job_id,) in rows:
+            self._update(job_id, status=QUEUED)
+            self.queue.put_nowait(job_id)
+        if rows:
+            logging.info(f"重新排入 {len(rows)} 個未完成的工作")
+        for i in range(self.workers):
+            asyncio.create_task(self._worker(i))
+        logging.info(f"工作佇列已啟動，共 {self.workers} 個 worker")
+
+    def submit(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        job_id = self._insert(kind, payload, QUEUED, job_id)
+        self.queue.put_nowait(job_id)
+        logging.info(f"已提交工作 {job_id} ({kind})")
+        return job_id
+
+    def track(self, kind: str, payload: Dict[str, Any], job_id: str) -> str:
+        """
+        記錄由同步端點直接執行的轉錄（狀態為 running，不經過佇列）
+        服務中途重啟時會由 start 重新排入佇列，結果可再以 /jobs/{id} 取得
+        """
+        self._insert(kind, payload, RUNNING, job_id)
+        self.tracked.add(job_id)
+        return job_id
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """同步端點執行結束時更新狀態，並通知訂閱者工作已結束"""
+        self.tracked.discard(job_id)
+        if error is None:
+            self._update(job_id, status=DONE, result=json.dumps(result, ensure_ascii=False))
+            self._emit(job_id, DONE, {"result": result})
+        else:
+            self._update(job_id, status=FAILED, error=error)
+            self._emit(job_id, FAILED, {"error": error})
+        self.partials.pop(job_id, None)
+        self.events.pop(job_id, None)
+
+    def _insert(self, kind: str, payload: Dict[str, Any], status: str, job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, status, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+            self.conn.commit()
+        self._write_session_state(job_id, create=True)
+        return job_id
+
+    def _write_session_state(self, job_id: str, create: bool = False):
+        """
+        將工作狀態寫入工作目錄，工作資料庫遺失時仍可由工作目錄還原
+        只在建立工作時建立目錄；目錄已被清除（例如失敗後刪除）時不再寫入
+        """
+        job = self.get(job_id)
+        if job is None:
+            return
+        session_dir = Path(SESSIONS_DIR) / job_id
+        if create:
+            session_dir.mkdir(parents=True, exist_ok=True)
+        elif not session_dir.is_dir():
+            return
+        state = {key: job[key] for key in ("id", "kind", "status", "payload", "error", "created_at", "updated_at")}
+        state_path = session_dir / SESSION_STATE_FILENAME
+        tmp_path = session_dir / f"{SESSION_STATE_FILENAME}.tmp"
+        tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, state_path)
+
+    def _restore_sessions(self):
+        """掃描工作目錄，將資料庫中沒有紀錄的未完成工作補回資料庫"""
+        restored = 0
+        for state_path in Path(SESSIONS_DIR).glob(f"*/{SESSION_STATE_FILENAME}"):
+            try:
+                state = json.loads(state_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if state.get("status") not in (QUEUED, RUNNING) or self.get(state["id"]) is not None:
+                continue
+            now = time.time()
+            with self.lock:
+                self.conn.execute(
+                    "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (state["id"], state["kind"], QUEUED, json.dumps(state["payload"], ensure_ascii=False), state.get("created_at", now), now)
+                )
+                self.conn.commit()
+            restored += 1
+        if restored:
+            logging.info(f"由工作目錄還原 {restored} 個未完成的工作")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, kind, status, payload, partial, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "payload": json.loads(row[3]),
+            "partial": json.loads(row[4]) if row[4] else None,
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "created_at": row[7],
+            "updated_at": row[8],
+        }
+
+    def _status(self, job_id: str) -> Optional[str]:
+        """只讀取狀態欄位，不解析部分結果與結果 JSON"""
+        with self.lock:
+            row = self.conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_partial(self, job_id: str) -> Dict[str, Any]:
+        """
+        回傳目前已完成片段的逐字稿（依片段順序排列）
+        逐字稿只保存在記憶體中；資料庫只記錄已完成的片段編號與總數（片段內容已在檢查點中）
+        """
+        partial = self.partials.get(job_id)
+        if partial is None:
+            job = self.get(job_id)
+            saved = (job or {}).get("partial") or {}
+            return {
+                "chunks_done": len(saved.get("chunks_done", [])),
+                "chunks_total": saved.get("chunks_total", 0),
+                "segments": [],
+            }
+        segments = []
+        for index in sorted(partial["chunks"]):
+            segments.extend(partial["chunks"][index])
+        return {
+            "chunks_done": len(partial["chunks"]),
+            "chunks_total": partial["chunks_total"],
+            "segments": segments,
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job["status"] not in (QUEUED, RUNNING):
+            return False
+        if job_id in self.tracked:
+            # 同步請求由 HTTP 連線直接執行，無法從這裡中止
+            return False
+        self._update(job_id, status=CANCELLED)
+        task = self.running.get(job_id)
+        if task:
+            task.cancel()
+        else:
+            self._emit(job_id, CANCELLED, {})
+            self.events.pop(job_id, None)
+        logging.info(f"已取消工作 {job_id}")
+        return True
+
+    def resume(self, job_id: str) -> bool:
+        """將已結束的工作重新排入佇列；工作目錄中的片段與檢查點會被沿用"""
+        job = self.get(job_id)
+        if job is None or job["status"] not in FINISHED:
+            return False
+        self._update(job_id, status=QUEUED, result=None, error=None)
+        self.events.pop(job_id, None)
+        self.queue.put_nowait(job_id)
+        logging.info(f"重新執行工作 {job_id}")
+        return True
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """依序產生工作事件（先補送已發生的事件），工作結束後停止；閒置時產生 None 作為心跳"""
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(job_id, []).append(queue)
+        try:
+            history = list(self.events.get(job_id, []))
+            last_seq = 0
+            for event in history:
+                last_seq = event["seq"]
+                yield event
+                if event["stage"] in FINISHED:
+                    return
+            
+            job = self.get(job_id)
+            if job and job["status"] in FINISHED:
+                # 工作已結束且事件已清除，補送已發生的事件後直接回報最終狀態
+                yield {"seq": last_seq + 1, "stage": job["status"], "data": {"result": job["result"], "error": job["error"]}}
+                return
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["seq"] <= last_seq:
+                    continue
+                yield event
+                if event["stage"] in FINISHED:
+                    return
+        finally:
+            self.subscribers[job_id].remove(queue)
+            if not self.subscribers[job_id]:
+                del self.subscribers[job_id]
+
+    def _emit(self, job_id: str, stage: str, data: Dict[str, Any]):
+        if stage not in FINISHED:
+            status = self._status(job_id)
+            if status is None or status in FINISHED:
+                # 工作結束後才完成的背景事件（例如不等待的摘要）不再保留，避免事件紀錄殘留
+                return
+        events = self.events.setdefault(job_id, [])
+        event = {"seq": len(events) + 1, "stage": stage, "data": data}
+        events.append(event)
+        for queue in self.subscribers.get(job_id, []):
+            queue.put_nowait(event)
+
+    def _on_event(self, job_id: str) -> Callable[[str, Dict[str, Any]], None]:
+        def on_event(stage: str, data: Dict[str, Any]):
+            if stage == "chunk":
+                partial = self.partials.setdefault(job_id, {"chunks_total": data["total"], "chunks": {}})
+                partial["chunks_total"] = data["total"]
+                partial["chunks"][data["index"]] = data["segments"]
+                # 只寫入片段編號與總數，每次更新的資料量固定，不隨逐字稿長度增加
+                progress = {"chunks_total": data["total"], "chunks_done": sorted(partial["chunks"])}
+                self._update(job_id, partial=json.dumps(progress))
+            self._emit(job_id, stage, data)
+        return on_event
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self.conn.commit()
+        if "status" in fields:
+            self._write_session_state(job_id)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id = await self.queue.get()
+            job = self.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                continue
+            self._update(job_id, status=RUNNING)
+            self._emit(job_id, RUNNING, {})
+            logging.info(f"Worker {worker_id} 開始執行工作 {job_id}")
+            task = asyncio.create_task(self.runner(job, self._on_event(job_id)))
+            self.running[job_id] = task
+            try:
+                result = await task
+                self._update(job_id, status=DONE, result=json.dumps(result, ensure_ascii=False))
+                self._emit(job_id, DONE, {"result": result})
+                logging.info(f"工作 {job_id} 完成")
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+                self._emit(job_id, CANCELLED, {})
+                logging.info(f"工作 {job_id} 已中止")
+            except Exception as e:
+                error = str(getattr(e, "detail", None) or e)
+                self._update(job_id, status=FAILED, error=error)
+                self._emit(job_id, FAILED, {"error": error})
+                logging.error(f"工作 {job_id} 失敗: {error}")
+            finally:
+                self.running.pop(job_id, None)
+                self.partials.pop(job_id, None)
+                self.events.pop(job_id, None)
+
+
+job_manager = JobManager()
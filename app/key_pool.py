@@ -0,0 +1,209 @@
+"""
+API Key Pool
+以一小時滑動視窗記錄每個 Groq API Key 已使用的音訊秒數與 LLM tokens
+每次請求向 KeyPool 租用一個 Key：挑選未在冷卻中、並行數未滿且剩餘額度最多的 Key
+全部不可用時，等到最早恢復的 Key（冷卻結束、額度釋出或其他請求歸還）再繼續
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, AsyncIterator
+
+# Groq 免費方案：每個 Key 每小時 7200 秒音訊；LLM tokens 上限預設不限制（0）
+AUDIO_SECONDS_PER_HOUR = int(os.environ.get("GROQ_AUDIO_SECONDS_PER_HOUR", "7200"))
+LLM_TOKENS_PER_HOUR = int(os.environ.get("GROQ_LLM_TOKENS_PER_HOUR", "0"))
+# Whisper API 每次請求最少以 10 秒計費
+MIN_BILLED_AUDIO_SEC = 10
+WINDOW_SEC = 3600
+# 每個 API Key 同時進行的請求上限
+MAX_CONCURRENT_PER_KEY = int(os.environ.get("GROQ_MAX_CONCURRENT_PER_KEY", "2"))
+
+AUDIO = "audio_seconds"
+TOKENS = "tokens"
+
+class KeyBudget:
+    def __init__(self, num_keys: int, audio_limit: int = AUDIO_SECONDS_PER_HOUR, token_limit: int = LLM_TOKENS_PER_HOUR):
+        self.limits = {AUDIO: audio_limit, TOKENS: token_limit}
+        # 每筆用量為 [時間戳, 數量]，保留在視窗內的紀錄
+        self.usage_log = [{AUDIO: deque(), TOKENS: deque()} for _ in range(num_keys)]
+
+    def _used(self, idx: int, kind: str, now: float) -> float:
+        entries = self.usage_log[idx][kind]
+        while entries and entries[0][0] <= now - WINDOW_SEC:
+            entries.popleft()
+        return sum(amount for _, amount in entries)
+
+    def headroom(self, idx: int, kind: str, now: Optional[float] = None) -> float:
+        """剩餘額度；未設定上限時回傳無限大"""
+        limit = self.limits[kind]
+        if not limit:
+            return float("inf")
+        return limit - self._used(idx, kind, now or time.time())
+
+    def fits(self, idx: int, audio_seconds: float, tokens: float, now: float) -> bool:
+        for kind, amount in ((AUDIO, audio_seconds), (TOKENS, tokens)):
+            limit = self.limits[kind]
+            # 單一請求超過上限時，視為需要整個視窗的額度
+            if limit and self.headroom(idx, kind, now) < min(amount, limit):
+                return False
+        return True
+
+    def score(self, idx: int, audio_seconds: float, now: float) -> float:
+        """剩餘額度比例，數值越大越優先"""
+        kind = AUDIO if audio_seconds else TOKENS
+        limit = self.limits[kind]
+        return self.headroom(idx, kind, now) / limit if limit else 1.0
+
+    def reserve(self, idx: int, audio_seconds: float = 0, tokens: float = 0) -> List[list]:
+        """送出請求前先記帳，讓同時進行的請求看到最新額度；回傳的紀錄可用 release 退回"""
+        now = time.time()
+        entries = []
+        for kind, amount in ((AUDIO, audio_seconds), (TOKENS, tokens)):
+            if amount:
+                entry = [now, amount]
+                self.usage_log[idx][kind].append(entry)
+                entries.append(entry)
+        return entries
+
+    def release(self, idx: int, entries: List[list]):
+        """請求未被計費（例如被拒絕）時退回預先記帳的額度"""
+        for kind in (AUDIO, TOKENS):
+            log = self.usage_log[idx][kind]
+            for entry in entries:
+                if entry in log:
+                    log.remove(entry)
+
+    def seconds_until_fits(self, idx: int, audio_seconds: float, tokens: float, now: float) -> float:
+        """估計此 Key 能容納此請求的等待秒數"""
+        wait = 0.0
+        for kind, amount in ((AUDIO, audio_seconds), (TOKENS, tokens)):
+            limit = self.limits[kind]
+            if not limit or not amount:
+                continue
+            excess = self._used(idx, kind, now) + min(amount, limit) - limit
+            for timestamp, used in self.usage_log[idx][kind]:
+                if excess <= 0:
+                    break
+                excess -= used
+                wait = max(wait, timestamp + WINDOW_SEC - now)
+        return wait
+
+    def usage(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        report = []
+        for idx in range(len(self.usage_log)):
+            report.append({
+                "key": idx + 1,
+                "audio_seconds_used": round(self._used(idx, AUDIO, now), 1),
+                "audio_seconds_limit": self.limits[AUDIO],
+                "tokens_used": int(self._used(idx, TOKENS, now)),
+                "tokens_limit": self.limits[TOKENS] or None,
+            })
+        return report
+
+
+class KeyLease:
+    def __init__(self, idx: int, client: Any, reservation: List[list]):
+        self.idx = idx
+        self.client = client
+        self.reservation = reservation
+        self.billed = True
+
+class KeyPool:
+    def __init__(self, clients: List[Any], max_concurrent: int = MAX_CONCURRENT_PER_KEY):
+        self.clients = clients
+        self.max_concurrent = max_concurrent
+        self.budget = KeyBudget(len(clients))
+        self.in_flight = [0] * len(clients)
+        self.cooldown_until = [0.0] * len(clients)
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # 延後到事件迴圈內才建立（Python 3.9 的 Condition 會綁定建立時的迴圈）
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _pick(self, audio_seconds: float, tokens: float, now: float) -> Optional[int]:
+        candidates = [
+            idx for idx in range(len(self.clients))
+            if self.cooldown_until[idx] <= now
+            and self.in_flight[idx] < self.max_concurrent
+            and self.budget.fits(idx, audio_seconds, tokens, now)
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda idx: (self.budget.score(idx, audio_seconds, now), -self.in_flight[idx]))
+
+    def seconds_until_available(self, audio_seconds: float = 0, tokens: float = 0) -> Optional[float]:
+        """
+        最早有 Key 冷卻結束或額度足夠的等待秒數
+        所有 Key 都只是並行數已滿時回傳 None（等待其他請求歸還即可）
+        """
+        now = time.time()
+        waits = [
+            max(self.cooldown_until[idx] - now, self.budget.seconds_until_fits(idx, audio_seconds, tokens, now))
+            for idx in range(len(self.clients))
+        ]
+        waits = [wait for wait in waits if wait > 0]
+        return min(waits) if waits else None
+
+    def estimated_wait(self, audio_seconds: float = 0, tokens: float = 0) -> float:
+        """估計租到 Key 前需等待的秒數；只是並行數已滿時視為不需等待"""
+        if self._pick(audio_seconds, tokens, time.time()) is not None:
+            return 0.0
+        return self.seconds_until_available(audio_seconds, tokens) or 0.0
+
+    async def acquire(self, audio_seconds: float = 0, tokens: float = 0) -> KeyLease:
+        """租用一個 Key 並預先記帳；沒有可用 Key 時等到最早恢復的時間點或有 Key 被歸還"""
+        if not self.clients:
+            raise ValueError("未設定任何 API Key")
+        async with self.condition:
+            while True:
+                now = time.time()
+                idx = self._pick(audio_seconds, tokens, now)
+                if idx is not None:
+                    self.in_flight[idx] += 1
+                    reservation = self.budget.reserve(idx, audio_seconds=audio_seconds, tokens=tokens)
+                    return KeyLease(idx, self.clients[idx], reservation)
+
+                wait_time = self.seconds_until_available(audio_seconds, tokens)
+                if wait_time is not None:
+                    logging.warning(f"目前沒有可用的 API Key，最快 {wait_time:.0f} 秒後恢復")
+                try:
+                    # 有 Key 被歸還時提前喚醒，否則等到最早恢復的時間點
+                    await asyncio.wait_for(self.condition.wait(), timeout=wait_time)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, lease: KeyLease):
+        async with self.condition:
+            self.in_flight[lease.idx] -= 1
+            if not lease.billed:
+                self.budget.release(lease.idx, lease.reservation)
+            self.condition.notify_all()
+
+    @asynccontextmanager
+    async def lease(self, audio_seconds: float = 0, tokens: float = 0) -> AsyncIterator[KeyLease]:
+        lease = await self.acquire(audio_seconds, tokens)
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+    def cooldown(self, idx: int, seconds: float):
+        """Key 回應 429 時設定冷卻截止時間，期間不會再被租用"""
+        self.cooldown_until[idx] = max(self.cooldown_until[idx], time.time() + seconds)
+        logging.info(f"API Key {idx + 1} 達到限制，冷卻 {seconds:.0f} 秒")
+
+    def usage(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        report = self.budget.usage()
+        for idx, entry in enumerate(report):
+            entry["in_flight"] = self.in_flight[idx]
+            entry["cooldown_seconds"] = round(max(self.cooldown_until[idx] - now, 0), 1)
+        return report
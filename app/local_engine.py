@@ -0,0 +1,149 @@
+"""
+Local Whisper Engine
+未設定 Groq API Key 時的本地轉錄引擎
+以 process pool 並行轉錄片段，每個 worker 只在啟動時載入一次模型，不阻塞事件迴圈
+本模組不匯入 whisper / torch；process pool 在第一次轉錄時才建立，只使用 Groq 時不會載入模型
+"""
+import os
+import asyncio
+import logging
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, List, Callable
+
+LOCAL_MODEL = os.environ.get("S2T_LOCAL_MODEL", "small")
+_CPU_COUNT = os.cpu_count() or 1
+# worker 數量與每個 worker 的 torch 執行緒數；預設讓所有 CPU 核心都被使用
+LOCAL_WORKERS = int(os.environ.get("S2T_LOCAL_WORKERS", str(max(1, _CPU_COUNT // 4))))
+LOCAL_THREADS_PER_WORKER = int(os.environ.get("S2T_LOCAL_THREADS", str(max(1, _CPU_COUNT // LOCAL_WORKERS))))
+# 本地推論的即時率初始估計（每秒音訊需要的運算秒數），實際轉錄後以指數移動平均更新
+LOCAL_RTF = float(os.environ.get("S2T_LOCAL_RTF", "0.5"))
+RTF_SMOOTHING = 0.3
+
+# ---- worker process 內執行的函式 ----
+
+_model = None
+
+def _init_worker(model_name: str, num_threads: int):
+    """每個 worker 啟動時設定執行緒數並載入模型一次"""
+    global _model
+    import torch
+    import whisper
+    torch.set_num_threads(num_threads)
+    _model = whisper.load_model(model_name)
+
+def _warmup() -> int:
+    return os.getpid()
+
+def _transcribe_file(audio_path: str, language: Optional[str]) -> Dict[str, Any]:
+    """轉錄單一檔案，只回傳可序列化的必要欄位與推論耗時"""
+    started = time.perf_counter()
+    result = _model.transcribe(audio_path, language=language)
+    return {
+        "elapsed": time.perf_counter() - started,
+        "text": result.get("text", ""),
+        "language": result.get("language", "unknown"),
+        "segments": [
+            {"start": float(seg["start"]), "end": float(seg["end"]), "text": seg["text"]}
+            for seg in result.get("segments", [])
+        ],
+    }
+
+# ---- 主程序端 ----
+
+class LocalEngine:
+    def __init__(self, model_name: str = LOCAL_MODEL, workers: int = LOCAL_WORKERS, threads_per_worker: int = LOCAL_THREADS_PER_WORKER):
+        self.model_name = model_name
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.rtf = LOCAL_RTF
+        # 已送出但尚未完成的音訊秒數，用來估計排隊時間
+        self.pending_seconds = 0.0
+
+    def start(self):
+        """第一次使用時建立 process pool，並讓每個 worker 預先載入模型"""
+        if self.executor is not None:
+            return
+        # 使用 spawn，避免 fork 已初始化 torch 執行緒的主程序
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name, self.threads_per_worker)
+        )
+        for _ in range(self.workers):
+            self.executor.submit(_warmup)
+        logging.info(f"本地 Whisper {self.model_name} 引擎：{self.workers} 個 worker，每個 {self.threads_per_worker} 執行緒")
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _reset(self, broken: Optional[ProcessPoolExecutor]):
+        """捨棄損毀的 pool 並建立新的；並行的片段只會重建一次"""
+        if self.executor is broken:
+            self.shutdown()
+        self.start()
+
+    def estimate_seconds(self, duration: float) -> float:
+        """估計現在送出一個 duration 秒的片段，到轉錄完成所需的秒數（含排隊中的片段）"""
+        return (self.pending_seconds / self.workers + duration) * self.rtf
+
+    async def transcribe_chunk(self, chunk: Dict[str, Any], language: Optional[str] = None) -> Dict[str, Any]:
+        """在 worker 中轉錄一個片段，時間軸平移到原始音訊，格式與 Groq 結果相同"""
+        self.start()
+        duration = max(chunk.get("end", chunk["start"]) - chunk["start"], 0)
+        self.pending_seconds += duration
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                result = await loop.run_in_executor(self.executor, _transcribe_file, chunk["path"], language)
+            except BrokenProcessPool:
+                # worker 異常結束（例如記憶體不足被終止）時整個 pool 都無法再使用：重建後重試一次
+                logging.warning("本地 Whisper process pool 已損毀，重新建立後重試")
+                self._reset(self.executor)
+                result = await loop.run_in_executor(self.executor, _transcribe_file, chunk["path"], language)
+        finally:
+            self.pending_seconds -= duration
+        if duration > 0:
+            self.rtf = RTF_SMOOTHING * result["elapsed"] / duration + (1 - RTF_SMOOTHING) * self.rtf
+        segments = [
+            {"start": seg["start"] + chunk["start"], "end": seg["end"] + chunk["start"], "text": seg["text"]}
+            for seg in result["segments"]
+        ]
+        return {"text": result["text"], "language": result["language"], "segments": segments, "success": True}
+
+    async def transcribe_chunks(self, chunks: List[Dict[str, Any]], language: Optional[str] = None, on_chunk: Optional[Callable] = None) -> Dict[str, Any]:
+        """將片段分散到所有 worker 並行轉錄，依片段順序重組結果；失敗的片段記錄在 failed_chunks，可續跑補齊"""
+        async def run_chunk(i: int, chunk: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            logging.info(f"本地轉錄片段 {i+1}/{len(chunks)}")
+            try:
+                result = await self.transcribe_chunk(chunk, language)
+            except Exception as e:
+                logging.error(f"本地轉錄片段 {i+1} 失敗: {str(e)}")
+                return None
+            if on_chunk:
+                on_chunk(i, len(chunks), result)
+            return result
+
+        results = await asyncio.gather(*(run_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+        failed_chunks = [
+            {"index": i, "start": chunk["start"], "end": chunk["end"]}
+            for i, (chunk, result) in enumerate(zip(chunks, results)) if result is None
+        ]
+        results = [result for result in results if result is not None]
+        segments = [seg for result in results for seg in result["segments"]]
+        language = next((result["language"] for result in reversed(results) if result["language"] != "unknown"), "unknown")
+        return {
+            "text": "".join(seg["text"] for seg in segments).strip(),
+            "segments": segments,
+            "language": language,
+            "failed_chunks": failed_chunks,
+        }
+
+
+local_engine = LocalEngine()
@@ -1,23 +1,27 @@
-from urllib.parse import unquote
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, status
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, StreamingResponse
+from urllib.parse import unquote, quote
+from email.utils import formatdate
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, status, Request
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import json
 import os
+import re
+import asyncio
 import shutil
 import uuid
-import tempfile
-import subprocess
 from pathlib import Path
 import logging
 import traceback
-import whisper
-import zipfile
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 import yt_dlp
 from app.groq_service import groq_service
+from app.cache import transcript_cache, hash_audio
+from app.audio import preprocess_audio, map_segments, load_manifest, save_manifest, MANIFEST_FILENAME
+from app.jobs import job_manager
+from app.local_engine import local_engine
+from app.renderers import render, render_outputs, build_zip, transcript_text, MEDIA_TYPES
 
 # 添加 Node.js 到 PATH（yt-dlp 需要 JS 運行時）
 os.environ["PATH"] = "/home/reyerchu/.nvm/versions/node/v20.19.6/bin:" + os.environ.get("PATH", "")
@@ -39,7 +43,8 @@ app = FastAPI(
 )
 
 # 服務前端靜態檔案
-app.mount("/s2t/static", StaticFiles(directory="/home/reyerchu/s2t/s2t/frontend/build/static"), name="static")
+# check_dir=False：前端尚未建置（例如執行測試）時仍可匯入此模組
+app.mount("/s2t/static", StaticFiles(directory="/home/reyerchu/s2t/s2t/frontend/build/static", check_dir=False), name="static")
 
 @app.get("/s2t", response_class=HTMLResponse)
 async def serve_root():
@@ -59,89 +64,188 @@ app.add_middleware(
 PREFIX = "/s2t/api"
 
 class TranscriptionRequest:
-    def __init__(self, file: UploadFile, output_formats: List[str]):
+    def __init__(self, file: UploadFile, output_formats: List[str], wait_summary: bool = True):
         self.file = file
         self.output_formats = output_formats
+        self.wait_summary = wait_summary
 
 class PasswordModel(BaseModel):
     password: str
 
+# 上傳檔案以固定大小區塊寫入磁碟，記憶體用量不隨檔案大小增加
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 區段下載（HTTP Range）每次讀取的大小
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# 轉錄結果保存在工作目錄中，供按需產生輸出格式
+RESULT_FILENAME = "result.json"
+
 ROOT_PASSWORD = "admin123"  # 在實際應用中，應該使用更安全的方式存儲和驗證密碼
 
 class LinkRequest(BaseModel):
     url: str
     output_formats: List[str]
+    # False 時不等待摘要即回傳結果，摘要完成後再加入 ZIP（以摘要狀態端點查詢）
+    wait_summary: bool = True
+
+class LinkJobRequest(LinkRequest):
+    # 工作 API 預設不等待摘要：逐字稿與 ZIP 完成即結束工作，摘要完成後再加入 ZIP
+    wait_summary: bool = False
+
+def notify(on_event: Optional[Callable], stage: str, **data):
+    """回報處理階段事件（供工作佇列的進度串流使用）"""
+    if on_event:
+        on_event(stage, data)
+
+def is_complete(result: Dict[str, Any]) -> bool:
+    """轉錄結果是否完整（沒有失敗的片段，也沒有翻譯失敗而保留原文的片段），只有完整的結果才寫入快取"""
+    return bool(result.get("segments")) and not result.get("failed_chunks") and not result.get("untranslated_chunks")
+
+def cleanup_failed_session(temp_dir: Path):
+    """
+    失敗時清理工作目錄；已有片段清單時保留整個目錄（輸入檔、片段與檢查點）
+    之後以 /jobs/{id}/resume 重新執行時只需轉錄缺少的片段
+    """
+    if (temp_dir / "chunks" / MANIFEST_FILENAME).exists():
+        logging.info(f"保留工作目錄供重新執行: {temp_dir}")
+        return
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+# yt-dlp 的下載為同步阻塞呼叫，以 asyncio.to_thread 執行，避免卡住其他工作與請求
+def ydl_extract_info(opts: Dict[str, Any], url: str, download: bool) -> Optional[Dict[str, Any]]:
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        return ydl.extract_info(url, download=download)
+
+def ydl_download(opts: Dict[str, Any], url: str):
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.download([url])
 
 class TranscriptionService:
     def __init__(self):
         self.use_groq = groq_service.is_available()
         if self.use_groq:
             logging.info("使用 Groq Whisper large-v3 API")
-            self.model = None
         else:
-            self.model = whisper.load_model("small")
-            logging.info("使用本地 Whisper small 模型")
+            # 模型在第一次轉錄時才由 worker 載入，啟動時不匯入 whisper / torch
+            logging.info(f"使用本地 Whisper {local_engine.model_name} 模型（首次轉錄時載入）")
+        # 進行中或失敗的摘要狀態：{"status": pending / failed, ...}；完成的摘要只保存在工作目錄的摘要檔中
+        self.summaries: Dict[str, Dict[str, Any]] = {}
+        # 背景任務需保留參照，避免執行中被回收
+        self.background_tasks = set()
 
-    async def process_audio(self, request: TranscriptionRequest) -> Dict[str, Any]:
-        logging.info(f"處理音頻文件: {request.file.filename}")
+    @property
+    def model_name(self) -> str:
+        return groq_service.whisper_model if self.use_groq else f"whisper-{local_engine.model_name}-local"
+
+    async def _transcribe(self, chunks: List[Dict[str, Any]], language: Optional[str] = None, on_event: Optional[Callable] = None,
+                          time_map: Optional[List[List[float]]] = None, checkpoint_dir: Optional[Path] = None) -> tuple:
+        """
+        轉錄預處理後的片段，回傳 (結果, 快取的摘要, 快取鍵)；快取命中時不呼叫轉錄引擎
+        片段已移除靜音時，以 time_map 將 segments 時間換算回原始音訊
+        checkpoint_dir 保存各片段的轉錄結果，重新執行時只轉錄缺少的片段
+        """
+        def on_chunk(index: int, total: int, result: Dict[str, Any]):
+            notify(on_event, "chunk", index=index, total=total, segments=map_segments(result.get("segments", []), time_map))
         
-        # 建立唯一工作目錄
-        session_id = str(uuid.uuid4())
+        notify(on_event, "transcribe", status="started")
+        cache_key = await asyncio.to_thread(hash_audio, [chunk["path"] for chunk in chunks], self.model_name, language)
+        cached = await asyncio.to_thread(transcript_cache.get, cache_key)
+        if cached:
+            # 快取內容已是原始時間軸
+            logging.info(f"轉錄快取命中: {cache_key[:12]}")
+            notify(on_event, "chunk", index=0, total=1, segments=cached["result"].get("segments", []))
+            notify(on_event, "transcribe", status="done", cached=True)
+            return cached["result"], cached["summary"], cache_key
+        
+        if self.use_groq:
+            result = await groq_service.transcribe_chunks(
+                chunks, language, on_chunk=on_chunk, checkpoint_dir=str(checkpoint_dir) if checkpoint_dir else None
+            )
+            # OpenCC 已在 transcribe 中將文字轉換為繁體中文
+            logging.info("Groq 轉錄完成（OpenCC 繁體轉換）")
+        else:
+            result = await local_engine.transcribe_chunks(chunks, language, on_chunk=on_chunk)
+        
+        result["segments"] = map_segments(result.get("segments", []), time_map)
+        if result.get("failed_chunks"):
+            result["failed_chunks"] = map_segments(result["failed_chunks"], time_map)
+        # 有片段失敗或翻譯未完成的結果不完整，不寫入快取
+        if is_complete(result):
+            await asyncio.to_thread(transcript_cache.put, cache_key, result)
+        notify(on_event, "transcribe", status="done", cached=False)
+        return result, None, cache_key
+
+    async def save_upload(self, file: UploadFile, session_id: str) -> Path:
+        """將上傳的文件保存到工作目錄，回傳保存路徑"""
         temp_dir = Path("temp") / session_id
         os.makedirs(temp_dir, exist_ok=True)
         logging.info(f"建立臨時目錄: {temp_dir}")
         
+        file_extension = os.path.splitext(file.filename)[1]
+        input_path = temp_dir / f"input{file_extension}"
+        
+        with open(input_path, "wb") as f:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, f, UPLOAD_CHUNK_SIZE)
+        
+        logging.info(f"原始文件已保存: {input_path}")
+        return input_path
+
+    async def process_audio(self, request: TranscriptionRequest) -> Dict[str, Any]:
+        logging.info(f"處理音頻文件: {request.file.filename}")
+        
+        # 建立唯一工作目錄
+        session_id = str(uuid.uuid4())
         try:
-            # 保存上傳的文件
-            original_filename = request.file.filename
-            file_extension = os.path.splitext(original_filename)[1]
-            input_path = temp_dir / f"input{file_extension}"
-            
-            with open(input_path, "wb") as f:
-                content = await request.file.read()
-                f.write(content)
-            
-            logging.info(f"原始文件已保存: {input_path}")
-            
-            # 預處理音頻 - 壓縮以符合 Groq API 限制
-            FFMPEG_PATH = "/home/reyerchu/.local/bin/ffmpeg"
-            processed_path = temp_dir / "compressed.mp3"
-            
-            # 壓縮為低比特率 MP3
-            cmd = [
-                FFMPEG_PATH, "-y", "-i", str(input_path),
-                "-vn", "-ar", "16000", "-ac", "1", "-b:a", "32k",
-                str(processed_path)
-            ]
-            
-            logging.info(f"執行 ffmpeg 命令: {' '.join(cmd)}")
-            
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE
+            input_path = await self.save_upload(request.file, session_id)
+        except Exception as e:
+            logging.error(f"保存上傳文件失敗: {str(e)}")
+            shutil.rmtree(Path("temp") / session_id, ignore_errors=True)
+            raise HTTPException(
+                status_code=500, 
+                detail=f"Error processing audio: {str(e)}"
             )
-            stdout, stderr = process.communicate()
-            
-            if process.returncode != 0:
-                error_message = stderr.decode('utf-8', errors='replace')
-                logging.error(f"ffmpeg 處理失敗: {error_message}")
+        
+        # 同步請求也記錄為工作：服務中途重啟時會自動續跑，結果可由 /jobs/{session_id} 取得
+        job_manager.track("upload", {
+            "input_path": str(input_path),
+            "filename": request.file.filename,
+            "output_formats": request.output_formats,
+            "wait_summary": request.wait_summary
+        }, session_id)
+        try:
+            result = await self.process_file(input_path, request.file.filename, request.output_formats, session_id, wait_summary=request.wait_summary)
+        except Exception as e:
+            job_manager.finish(session_id, error=str(getattr(e, "detail", None) or e))
+            raise
+        job_manager.finish(session_id, _result_response(result))
+        return result
+
+    async def process_file(self, input_path: Path, original_filename: str, output_formats: List[str], session_id: str, on_event: Optional[Callable] = None,
+                           wait_summary: bool = True) -> Dict[str, Any]:
+        """處理已保存在工作目錄中的音訊檔：預處理、轉錄並生成輸出"""
+        temp_dir = input_path.parent
+        chunk_dir = temp_dir / "chunks"
+        
+        try:
+            # 預處理音頻 - 單次 ffmpeg 直接輸出符合 Groq API 限制的壓縮片段（重新執行時沿用先前的片段）
+            notify(on_event, "ffmpeg", status="started")
+            try:
+                prepared = await asyncio.to_thread(load_manifest, str(chunk_dir)) or await preprocess_audio(str(input_path), str(chunk_dir))
+            except RuntimeError as e:
+                logging.error(f"ffmpeg 處理失敗: {str(e)}")
                 raise HTTPException(
                     status_code=500, 
-                    detail=f"Audio preprocessing failed: {error_message}"
+                    detail=f"Audio preprocessing failed: {str(e)}"
                 )
             
             logging.info("音頻預處理完成")
+            notify(on_event, "ffmpeg", status="done", chunks=len(prepared["chunks"]), duration=prepared["duration"])
             
             # 使用 Whisper 進行轉錄
             logging.info("開始進行轉錄...")
             try:
-                if self.use_groq:
-                    result = await groq_service.transcribe(str(processed_path))
-                    # OpenCC 已在 transcribe 中將文字轉換為繁體中文
-                    logging.info("Groq 轉錄完成（OpenCC 繁體轉換）")
-                else:
-                    result = self.model.transcribe(str(processed_path))
+                result, cached_summary, cache_key = await self._transcribe(
+                    prepared["chunks"], on_event=on_event, time_map=prepared["time_map"], checkpoint_dir=chunk_dir
+                )
                 logging.info("轉錄完成")
             except Exception as e:
                 logging.error(f"轉錄失敗: {str(e)}")
@@ -152,134 +256,195 @@ class TranscriptionService:
                 )
             
             # 處理輸出
-            logging.info(f"生成輸出格式: {request.output_formats}")
-            outputs = {}
             base_filename = os.path.splitext(original_filename)[0]
-            
-            # 生成各種格式
-            for fmt in request.output_formats:
-                output_path = temp_dir / f"{base_filename}.{fmt}"
-                if fmt == "txt":
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        # 優先使用 LLM 校正後的繁體中文
-                        if "corrected_text" in result and result["corrected_text"]:
-                            f.write(result["corrected_text"])
-                        else:
-                            text_lines = [segment["text"].strip() for segment in result["segments"]]
-                            f.write("\n".join(text_lines))
-                elif fmt == "srt":
-                    self._write_srt(result["segments"], output_path)
-                elif fmt == "vtt":
-                    self._write_vtt(result["segments"], output_path)
-                elif fmt == "tsv":
-                    self._write_tsv(result["segments"], output_path)
-                elif fmt == "json":
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        json.dump(result, f, ensure_ascii=False, indent=2)
-                
-                # 讀取輸出文件內容
-                with open(output_path, "r", encoding="utf-8") as f:
-                    outputs[fmt] = f.read()
-                
-                logging.info(f"已生成 {fmt} 格式: {output_path}")
-            
-            # 生成摘要
-            summary = ""
-            if "txt" in request.output_formats:
-                full_text = outputs.get("txt", "")
-                if full_text and len(full_text) > 200:
-                    try:
-                        summary = await groq_service.summarize(full_text)
-                        if summary:
-                            summary_path = temp_dir / f"{base_filename}_摘要.txt"
-                            with open(summary_path, "w", encoding="utf-8") as f:
-                                f.write(summary)
-                            outputs["summary"] = summary
-                            logging.info(f"已生成摘要: {summary_path}")
-                    except Exception as e:
-                        logging.error(f"生成摘要失敗: {str(e)}")
-            
-            # 創建 ZIP 文件
-            zip_path = temp_dir / f"{base_filename}.zip"
-            with zipfile.ZipFile(zip_path, "w") as zip_file:
-                for fmt in request.output_formats:
-                    file_path = temp_dir / f"{base_filename}.{fmt}"
-                    zip_file.write(file_path, arcname=f"{base_filename}.{fmt}")
-                # 加入摘要檔案
-                summary_path = temp_dir / f"{base_filename}_摘要.txt"
-                if summary_path.exists():
-                    zip_file.write(summary_path, arcname=f"{base_filename}_摘要.txt")
-            
-            logging.info(f"已創建 ZIP 文件: {zip_path}")
-            
-            # 返回結果和 ZIP 文件路徑
-            return {
-                "data": outputs,
-                "zip_path": str(zip_path),
-                "session_id": session_id,
-                "filename": base_filename
-            }
+            return await self._finalize(result, cached_summary, cache_key, temp_dir, base_filename, output_formats, session_id, on_event, wait_summary)
             
         except Exception as e:
             logging.error(f"處理過程中發生錯誤: {str(e)}")
             traceback.print_exc()
-            # 清理臨時目錄
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            # 清理臨時目錄（已預處理出片段時保留，供重新執行）
+            cleanup_failed_session(temp_dir)
             raise HTTPException(
                 status_code=500, 
                 detail=f"Error processing audio: {str(e)}"
             )
     
-    def _write_srt(self, segments, output_path):
-        with open(output_path, "w", encoding="utf-8") as f:
-            for i, segment in enumerate(segments, start=1):
-                start_time = self._format_timestamp(segment["start"], format="srt")
-                end_time = self._format_timestamp(segment["end"], format="srt")
-                text = segment["text"].strip()
-                f.write(f"{i}\n{start_time} --> {end_time}\n{text}\n\n")
+    async def _finalize(self, result: Dict[str, Any], cached_summary: Optional[str], cache_key: str, temp_dir: Path, base_filename: str, output_formats: List[str], session_id: str,
+                        on_event: Optional[Callable] = None, wait_summary: bool = True) -> Dict[str, Any]:
+        """
+        由轉錄結果生成各輸出格式、摘要與 ZIP 檔
+        各格式只在記憶體中產生一次，磁碟上只寫入 result.json（供按需產生格式）與 ZIP
+        摘要與格式產生同時進行；wait_summary 為 False 時先回傳結果，摘要完成後再加入 ZIP
+        """
+        logging.info(f"生成輸出格式: {output_formats}")
+        
+        # 摘要只需要逐字稿文字，與輸出格式的產生同時進行
+        summary_task = None
+        full_text = transcript_text(result)
+        if "txt" in output_formats and len(full_text) > 200:
+            self.summaries[session_id] = {"status": "pending", "summary": None}
+            summary_task = asyncio.create_task(
+                self._generate_summary(full_text, cached_summary, cache_key, temp_dir, base_filename, session_id, on_event)
+            )
+        
+        result_path = temp_dir / RESULT_FILENAME
+        await asyncio.to_thread(result_path.write_text, json.dumps(result, ensure_ascii=False), encoding="utf-8")
+        outputs = await asyncio.to_thread(render_outputs, result, output_formats)
+        
+        summary = ""
+        if summary_task and wait_summary:
+            summary = await summary_task
+            summary_task = None
+        if summary:
+            outputs["summary"] = summary
+        
+        # 創建 ZIP 文件
+        zip_path = await self._write_zip(outputs, temp_dir, base_filename)
+        notify(on_event, "zip", status="done", filename=f"{base_filename}.zip")
+        
+        if summary_task:
+            task = asyncio.create_task(self._append_summary_later(summary_task, outputs, temp_dir, base_filename))
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+        
+        summary_state = await asyncio.to_thread(self.get_summary, session_id)
+        summary_status = summary_state["status"] if summary_state else "none"
+        
+        # 返回結果和 ZIP 文件路徑
+        return {
+            "data": outputs,
+            "zip_path": str(zip_path),
+            "session_id": session_id,
+            "filename": base_filename,
+            "summary_status": summary_status,
+            "failed_chunks": result.get("failed_chunks", []),
+            "untranslated_chunks": result.get("untranslated_chunks", [])
+        }
+    
+    async def _write_zip(self, outputs: Dict[str, str], temp_dir: Path, base_filename: str) -> Path:
+        """以記憶體中的內容建立 ZIP 並一次寫入磁碟"""
+        files = {f"{base_filename}.{fmt}": content for fmt, content in outputs.items() if fmt != "summary"}
+        if outputs.get("summary"):
+            files[f"{base_filename}_摘要.txt"] = outputs["summary"]
+        zip_path = temp_dir / f"{base_filename}.zip"
+        # 先寫入暫存檔再替換，進行中的下載不會讀到寫到一半的檔案
+        tmp_path = temp_dir / f"{base_filename}.zip.tmp"
+        await asyncio.to_thread(tmp_path.write_bytes, build_zip(files))
+        await asyncio.to_thread(os.replace, tmp_path, zip_path)
+        logging.info(f"已創建 ZIP 文件: {zip_path}")
+        return zip_path
+    
+    async def _generate_summary(self, full_text: str, cached_summary: Optional[str], cache_key: str, temp_dir: Path, base_filename: str, session_id: str,
+                                on_event: Optional[Callable] = None) -> str:
+        """生成摘要並寫入摘要檔；失敗時回傳空字串"""
+        try:
+            notify(on_event, "summary", status="started")
+            summary = cached_summary or await groq_service.summarize(full_text)
+            if summary:
+                if summary != cached_summary:
+                    await asyncio.to_thread(transcript_cache.set_summary, cache_key, summary)
+                summary_path = temp_dir / f"{base_filename}_摘要.txt"
+                await asyncio.to_thread(summary_path.write_text, summary, encoding="utf-8")
+                logging.info(f"已生成摘要: {summary_path}")
+                # 摘要已寫入檔案，由 get_summary 從檔案讀取，不常駐記憶體
+                self.summaries.pop(session_id, None)
+            else:
+                self.summaries[session_id] = {"status": "failed", "summary": None, "error": "摘要為空"}
+            notify(on_event, "summary", status="done", summary=summary)
+            return summary
+        except Exception as e:
+            logging.error(f"生成摘要失敗: {str(e)}")
+            self.summaries[session_id] = {"status": "failed", "summary": None, "error": str(e)}
+            notify(on_event, "summary", status="failed", error=str(e))
+            return ""
+    
+    async def _append_summary_later(self, summary_task: asyncio.Task, outputs: Dict[str, str], temp_dir: Path, base_filename: str):
+        """
+        不等待摘要時：摘要完成後重新建立含摘要的 ZIP
+        不在原檔上附加，而是整個替換，已開始的下載仍讀取舊檔案
+        """
+        summary = await summary_task
+        if not summary:
+            return
+        zip_path = await self._write_zip({**outputs, "summary": summary}, temp_dir, base_filename)
+        logging.info(f"摘要已加入 ZIP 文件: {zip_path}")
     
-    def _write_vtt(self, segments, output_path):
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write("WEBVTT\n\n")
-            for i, segment in enumerate(segments):
-                start_time = self._format_timestamp(segment["start"], format="vtt")
-                end_time = self._format_timestamp(segment["end"], format="vtt")
-                text = segment["text"].strip()
-                f.write(f"{i+1}\n{start_time} --> {end_time}\n{text}\n\n")
+    async def _transcribe_link(self, prepared: Dict[str, Any], link_key: Optional[str], request: LinkRequest, temp_dir: Path, session_id: str,
+                               on_event: Optional[Callable] = None) -> Dict[str, Any]:
+        """轉錄已下載並預處理的連結音訊，寫入連結快取並生成輸出"""
+        base_filename = prepared["title"]
+        
+        # 使用 Whisper 進行轉錄
+        logging.info("開始進行轉錄...")
+        try:
+            result, cached_summary, cache_key = await self._transcribe(
+                prepared["chunks"], on_event=on_event, time_map=prepared["time_map"], checkpoint_dir=temp_dir / "chunks"
+            )
+            logging.info("轉錄完成")
+        except Exception as e:
+            logging.error(f"轉錄失敗: {str(e)}")
+            traceback.print_exc()
+            raise HTTPException(
+                status_code=500, 
+                detail=f"轉錄失敗: {str(e)}"
+            )
+        
+        if link_key and is_complete(result):
+            transcript_cache.put_link(link_key, cache_key, base_filename)
+        
+        # 處理輸出
+        return await self._finalize(result, cached_summary, cache_key, temp_dir, base_filename, request.output_formats, session_id, on_event, request.wait_summary)
     
-    def _write_tsv(self, segments, output_path):
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write("start\tend\ttext\n")
-            for segment in segments:
-                start_time = segment["start"]
-                end_time = segment["end"]
-                text = segment["text"].strip()
-                f.write(f"{start_time}\t{end_time}\t{text}\n")
+    def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """查詢摘要狀態；服務重啟後以工作目錄中的摘要檔判斷"""
+        state = self.summaries.get(session_id)
+        if state:
+            return state
+        for summary_path in (Path("temp") / session_id).glob("*_摘要.txt"):
+            return {"status": "done", "summary": summary_path.read_text(encoding="utf-8")}
+        return None
     
-    def _format_timestamp(self, seconds, format="srt"):
-        hours, seconds = divmod(seconds, 3600)
-        minutes, seconds = divmod(seconds, 60)
-        milliseconds = int((seconds - int(seconds)) * 1000)
-        seconds = int(seconds)
-        
-        if format == "srt":
-            return f"{int(hours):02d}:{int(minutes):02d}:{seconds:02d},{milliseconds:03d}"
-        elif format == "vtt":
-            return f"{int(hours):02d}:{int(minutes):02d}:{seconds:02d}.{milliseconds:03d}"
-        else:
-            return seconds
+    def _link_cache_key(self, url: str) -> Optional[str]:
+        """以 yt-dlp 解析 extractor 與影片 ID，讓同一影片的不同網址形式對應到同一快取項目"""
+        try:
+            opts = {'quiet': True, 'skip_download': True, 'nocheckcertificate': True, 'js_runtimes': {'node': {}}}
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                info = ydl.extract_info(url, download=False, process=False)
+            if info and info.get('id'):
+                return f"{info.get('extractor_key') or info.get('extractor')}:{info['id']}"
+        except Exception as e:
+            logging.warning(f"無法解析影片 ID: {str(e)}")
+        return None
 
-    async def process_link(self, request: LinkRequest) -> Dict[str, Any]:
+    async def process_link(self, request: LinkRequest, session_id: Optional[str] = None, on_event: Optional[Callable] = None) -> Dict[str, Any]:
         logging.info(f"處理連結: {request.url}")
         
         # 建立唯一工作目錄
-        session_id = str(uuid.uuid4())
+        session_id = session_id or str(uuid.uuid4())
         temp_dir = Path("temp") / session_id
         os.makedirs(temp_dir, exist_ok=True)
         logging.info(f"建立臨時目錄: {temp_dir}")
         
         try:
+            # 下載前先查詢連結快取
+            link_key = None
+            if any(domain in request.url for domain in ("youtube.com", "youtu.be", "facebook.com", "fb.watch", "drive.google.com")):
+                link_key = await asyncio.to_thread(self._link_cache_key, request.url)
+            if link_key:
+                cached = await asyncio.to_thread(transcript_cache.get_link, link_key)
+                if cached:
+                    logging.info(f"連結快取命中: {link_key}，略過下載與轉錄")
+                    return await self._finalize(cached["result"], cached["summary"], cached["audio_key"], temp_dir, cached["title"], request.output_formats, session_id, on_event, request.wait_summary)
+            
+            # 重新執行的工作：先前已下載並預處理過，直接沿用片段與已完成的轉錄結果
+            chunk_dir = temp_dir / "chunks"
+            prepared = await asyncio.to_thread(load_manifest, str(chunk_dir))
+            if prepared and prepared.get("title"):
+                logging.info(f"沿用先前預處理的 {len(prepared['chunks'])} 個片段")
+                return await self._transcribe_link(prepared, link_key, request, temp_dir, session_id, on_event)
+            
             # 判斷連結類型
+            notify(on_event, "download", status="started")
             if "youtube.com" in request.url or "youtu.be" in request.url or "facebook.com" in request.url or "fb.watch" in request.url:
                 platform = "Facebook" if "facebook.com" in request.url or "fb.watch" in request.url else "YouTube"
                 logging.info(f"下載 {platform} 視頻")
@@ -302,12 +467,11 @@ class TranscriptionService:
                     # 直接下載並獲取視頻信息
                     video_title = "facebook_video" if "facebook.com" in request.url or "fb.watch" in request.url else "youtube_video"
                     
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(request.url, download=True)
-                        if info and 'title' in info:
-                            video_title = info.get('title', 'youtube_video')
-                            video_title = "".join(c for c in video_title if c.isalnum() or c in (' ', '-', '_')).strip()
-                            logging.info(f"成功下載視頻: {video_title}")
+                    info = await asyncio.to_thread(ydl_extract_info, ydl_opts, request.url, True)
+                    if info and 'title' in info:
+                        video_title = info.get('title', 'youtube_video')
+                        video_title = "".join(c for c in video_title if c.isalnum() or c in (' ', '-', '_')).strip()
+                        logging.info(f"成功下載視頻: {video_title}")
                     
                     # 檢查是否下載成功
                     input_files = list(temp_dir.glob('input.*'))
@@ -332,8 +496,7 @@ class TranscriptionService:
                             'Upgrade-Insecure-Requests': '1',
                         }
                         
-                        with yt_dlp.YoutubeDL(backup_opts) as ydl:
-                            ydl.download([request.url])
+                        await asyncio.to_thread(ydl_download, backup_opts, request.url)
                         
                         # 再次檢查
                         input_files = list(temp_dir.glob('input.*'))
@@ -367,40 +530,10 @@ class TranscriptionService:
                         "language": "zh"
                     }
                     
-                    # 處理輸出
-                    outputs = {}
+                    # 處理輸出（txt 顯示錯誤說明）
                     base_filename = "youtube_error"
-                    
-                    # 生成各種格式
-                    for fmt in request.output_formats:
-                        output_path = temp_dir / f"{base_filename}.{fmt}"
-                        if fmt == "txt":
-                            with open(output_path, "w", encoding="utf-8") as f:
-                                f.write(formatted_error)
-                        elif fmt == "srt":
-                            self._write_srt(mock_segments, output_path)
-                        elif fmt == "vtt":
-                            self._write_vtt(mock_segments, output_path)
-                        elif fmt == "tsv":
-                            self._write_tsv(mock_segments, output_path)
-                        elif fmt == "json":
-                            with open(output_path, "w", encoding="utf-8") as f:
-                                json.dump(result, f, ensure_ascii=False, indent=2)
-                        
-                        # 讀取輸出文件內容
-                        with open(output_path, "r", encoding="utf-8") as f:
-                            outputs[fmt] = f.read()
-                        
-                        logging.info(f"已生成 {fmt} 格式: {output_path}")
-                    
-                    # 創建 ZIP 文件
-                    zip_path = temp_dir / f"{base_filename}.zip"
-                    with zipfile.ZipFile(zip_path, "w") as zip_file:
-                        for fmt in request.output_formats:
-                            file_path = temp_dir / f"{base_filename}.{fmt}"
-                            zip_file.write(file_path, arcname=f"{base_filename}.{fmt}")
-                    
-                    logging.info(f"已創建 ZIP 文件: {zip_path}")
+                    outputs = render_outputs(result, request.output_formats, overrides={"txt": formatted_error})
+                    zip_path = await self._write_zip(outputs, temp_dir, base_filename)
                     
                     # 返回錯誤消息但不拋出異常
                     return {
@@ -443,22 +576,20 @@ class TranscriptionService:
                     try:
                         info_opts = ydl_opts.copy()
                         info_opts['skip_download'] = True
-                        with yt_dlp.YoutubeDL(info_opts) as info_ydl:
-                            info = info_ydl.extract_info(request.url, download=False)
-                            if info and 'title' in info:
-                                file_name = info.get('title', 'google_drive_file')
-                                # 清理文件名中的非法字符
-                                file_name = "".join(c for c in file_name if c.isalnum() or c in (' ', '-', '_')).strip()
-                                logging.info(f"成功獲取文件名: {file_name}")
+                        info = await asyncio.to_thread(ydl_extract_info, info_opts, request.url, False)
+                        if info and 'title' in info:
+                            file_name = info.get('title', 'google_drive_file')
+                            # 清理文件名中的非法字符
+                            file_name = "".join(c for c in file_name if c.isalnum() or c in (' ', '-', '_')).strip()
+                            logging.info(f"成功獲取文件名: {file_name}")
                     except Exception as e:
                         logging.warning(f"無法獲取文件名: {str(e)}")
                     
                     # 直接下載
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        # 嘗試禁用 SSL 驗證
-                        import ssl
-                        ssl._create_default_https_context = ssl._create_unverified_context
-                        ydl.download([request.url])
+                    # 嘗試禁用 SSL 驗證
+                    import ssl
+                    ssl._create_default_https_context = ssl._create_unverified_context
+                    await asyncio.to_thread(ydl_download, ydl_opts, request.url)
                     
                     # 檢查是否下載成功
                     input_files = list(temp_dir.glob('input.*'))
@@ -470,8 +601,7 @@ class TranscriptionService:
                         backup_opts['force_generic_extractor'] = True
                         backup_opts['cachedir'] = False
                         
-                        with yt_dlp.YoutubeDL(backup_opts) as ydl:
-                            ydl.download([request.url])
+                        await asyncio.to_thread(ydl_download, backup_opts, request.url)
                         
                         # 再次檢查
                         input_files = list(temp_dir.glob('input.*'))
@@ -505,40 +635,10 @@ class TranscriptionService:
                         "language": "zh"
                     }
                     
-                    # 處理輸出
-                    outputs = {}
+                    # 處理輸出（txt 顯示錯誤說明）
                     base_filename = "google_drive_error"
-                    
-                    # 生成各種格式
-                    for fmt in request.output_formats:
-                        output_path = temp_dir / f"{base_filename}.{fmt}"
-                        if fmt == "txt":
-                            with open(output_path, "w", encoding="utf-8") as f:
-                                f.write(formatted_error)
-                        elif fmt == "srt":
-                            self._write_srt(mock_segments, output_path)
-                        elif fmt == "vtt":
-                            self._write_vtt(mock_segments, output_path)
-                        elif fmt == "tsv":
-                            self._write_tsv(mock_segments, output_path)
-                        elif fmt == "json":
-                            with open(output_path, "w", encoding="utf-8") as f:
-                                json.dump(result, f, ensure_ascii=False, indent=2)
-                        
-                        # 讀取輸出文件內容
-                        with open(output_path, "r", encoding="utf-8") as f:
-                            outputs[fmt] = f.read()
-                        
-                        logging.info(f"已生成 {fmt} 格式: {output_path}")
-                    
-                    # 創建 ZIP 文件
-                    zip_path = temp_dir / f"{base_filename}.zip"
-                    with zipfile.ZipFile(zip_path, "w") as zip_file:
-                        for fmt in request.output_formats:
-                            file_path = temp_dir / f"{base_filename}.{fmt}"
-                            zip_file.write(file_path, arcname=f"{base_filename}.{fmt}")
-                    
-                    logging.info(f"已創建 ZIP 文件: {zip_path}")
+                    outputs = render_outputs(result, request.output_formats, overrides={"txt": formatted_error})
+                    zip_path = await self._write_zip(outputs, temp_dir, base_filename)
                     
                     # 返回錯誤消息但不拋出異常
                     return {
@@ -560,132 +660,36 @@ class TranscriptionService:
                     status_code=500,
                     detail="下載失敗：未找到音頻文件"
                 )
+            notify(on_event, "download", status="done")
             
-            # 預處理音頻
-            processed_path = temp_dir / "processed.wav"
-            input_path = input_files[0]  # 使用找到的第一個文件
-            
-            # 使用 ffmpeg 轉換為 WAV 格式
-            cmd = [
-                "ffmpeg", "-i", str(input_path), 
-                "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le", 
-                str(processed_path)
-            ]
-            
-            logging.info(f"執行 ffmpeg 命令: {' '.join(cmd)}")
-            
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE
-            )
-            stdout, stderr = process.communicate()
-            
-            if process.returncode != 0:
-                error_message = stderr.decode('utf-8', errors='replace')
-                logging.error(f"ffmpeg 處理失敗: {error_message}")
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"音頻預處理失敗: {error_message}"
-                )
-            
-            logging.info("音頻預處理完成")
+            # 使用視頻標題或文件名作為基礎文件名
+            base_filename = video_title if "youtube.com" in request.url or "youtu.be" in request.url or "facebook.com" in request.url or "fb.watch" in request.url else file_name
+            logging.info(f"使用檔案名稱: {base_filename} 作為輸出文件前綴")
             
-            # 使用 Whisper 進行轉錄
-            logging.info("開始進行轉錄...")
+            # 預處理音頻 - 單次 ffmpeg 直接輸出 API 可用的壓縮片段
+            input_path = input_files[0]  # 使用找到的第一個文件
+            notify(on_event, "ffmpeg", status="started")
             try:
-                if self.use_groq:
-                    result = await groq_service.transcribe(str(processed_path))
-                    # OpenCC 已在 transcribe 中將文字轉換為繁體中文
-                    logging.info("Groq 轉錄完成（OpenCC 繁體轉換）")
-                else:
-                    result = self.model.transcribe(str(processed_path))
-                logging.info("轉錄完成")
-            except Exception as e:
-                logging.error(f"轉錄失敗: {str(e)}")
-                traceback.print_exc()
+                prepared = await preprocess_audio(str(input_path), str(chunk_dir))
+            except RuntimeError as e:
+                logging.error(f"ffmpeg 處理失敗: {str(e)}")
                 raise HTTPException(
                     status_code=500, 
-                    detail=f"轉錄失敗: {str(e)}"
+                    detail=f"音頻預處理失敗: {str(e)}"
                 )
+            prepared["title"] = base_filename
+            await asyncio.to_thread(save_manifest, str(chunk_dir), prepared)
             
-            # 處理輸出
-            logging.info(f"生成輸出格式: {request.output_formats}")
-            outputs = {}
-            
-            # 使用視頻標題或文件名作為基礎文件名
-            base_filename = video_title if "youtube.com" in request.url or "youtu.be" in request.url or "facebook.com" in request.url or "fb.watch" in request.url else file_name
-            logging.info(f"使用檔案名稱: {base_filename} 作為輸出文件前綴")
-            
-            # 生成各種格式
-            for fmt in request.output_formats:
-                output_path = temp_dir / f"{base_filename}.{fmt}"
-                if fmt == "txt":
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        # 優先使用 LLM 校正後的繁體中文
-                        if "corrected_text" in result and result["corrected_text"]:
-                            f.write(result["corrected_text"])
-                        else:
-                            text_lines = [segment["text"].strip() for segment in result["segments"]]
-                            f.write("\n".join(text_lines))
-                elif fmt == "srt":
-                    self._write_srt(result["segments"], output_path)
-                elif fmt == "vtt":
-                    self._write_vtt(result["segments"], output_path)
-                elif fmt == "tsv":
-                    self._write_tsv(result["segments"], output_path)
-                elif fmt == "json":
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        json.dump(result, f, ensure_ascii=False, indent=2)
-                
-                # 讀取輸出文件內容
-                with open(output_path, "r", encoding="utf-8") as f:
-                    outputs[fmt] = f.read()
-                
-                logging.info(f"已生成 {fmt} 格式: {output_path}")
-            
-            # 生成摘要
-            summary = ""
-            if "txt" in request.output_formats:
-                full_text = outputs.get("txt", "")
-                if full_text and len(full_text) > 200:
-                    try:
-                        summary = await groq_service.summarize(full_text)
-                        if summary:
-                            summary_path = temp_dir / f"{base_filename}_摘要.txt"
-                            with open(summary_path, "w", encoding="utf-8") as f:
-                                f.write(summary)
-                            outputs["summary"] = summary
-                            logging.info(f"已生成摘要: {summary_path}")
-                    except Exception as e:
-                        logging.error(f"生成摘要失敗: {str(e)}")
-            
-            # 創建 ZIP 文件
-            zip_path = temp_dir / f"{base_filename}.zip"
-            with zipfile.ZipFile(zip_path, "w") as zip_file:
-                for fmt in request.output_formats:
-                    file_path = temp_dir / f"{base_filename}.{fmt}"
-                    zip_file.write(file_path, arcname=f"{base_filename}.{fmt}")
-                # 加入摘要檔案
-                summary_path = temp_dir / f"{base_filename}_摘要.txt"
-                if summary_path.exists():
-                    zip_file.write(summary_path, arcname=f"{base_filename}_摘要.txt")
-            
-            logging.info(f"已創建 ZIP 文件: {zip_path}")
+            logging.info("音頻預處理完成")
+            notify(on_event, "ffmpeg", status="done", chunks=len(prepared["chunks"]), duration=prepared["duration"])
             
-            # 返回結果和 ZIP 文件路徑
-            return {
-                "data": outputs,
-                "zip_path": str(zip_path),
-                "session_id": session_id,
-                "filename": base_filename
-            }
+            return await self._transcribe_link(prepared, link_key, request, temp_dir, session_id, on_event)
             
         except Exception as e:
             logging.error(f"處理過程中發生錯誤: {str(e)}")
             traceback.print_exc()
-            # 清理臨時目錄
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            # 清理臨時目錄（已預處理出片段時保留，供重新執行）
+            cleanup_failed_session(temp_dir)
             raise HTTPException(
                 status_code=500, 
                 detail=f"處理連結時發生錯誤: {str(e)}"
@@ -694,10 +698,24 @@ class TranscriptionService:
 # 創建轉錄服務實例
 transcription_service = TranscriptionService()
 
+def _result_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    """同步轉錄端點與工作結果共用的回應格式"""
+    session_id = result["session_id"]
+    return {
+        "data": result["data"],
+        "zip_url": f"{PREFIX}/download/{session_id}/{result['filename']}.zip",
+        "summary_status": result.get("summary_status", "none"),
+        "summary_url": f"{PREFIX}/summary/{session_id}",
+        "render_url": f"{PREFIX}/render/{session_id}/{{format}}",
+        "failed_chunks": result.get("failed_chunks", []),
+        "untranslated_chunks": result.get("untranslated_chunks", []),
+    }
+
 @app.post(f"{PREFIX}/transcribe")
 async def transcribe(
     file: UploadFile = File(...),
-    output_formats: str = Form(None)
+    output_formats: str = Form(None),
+    wait_summary: bool = Form(True)
 ):
     try:
         # 解析輸出格式
@@ -713,15 +731,11 @@ async def transcribe(
         logging.info(f"接收到轉錄請求: {file.filename}, 格式: {formats}")
         
         # 處理音頻
-        request = TranscriptionRequest(file=file, output_formats=formats)
+        request = TranscriptionRequest(file=file, output_formats=formats, wait_summary=wait_summary)
         result = await transcription_service.process_audio(request)
         
         # 返回結果
-        zip_url = f"{PREFIX}/download/{result['session_id']}/{result['filename']}.zip"
-        return JSONResponse({
-            "data": result["data"],
-            "zip_url": zip_url
-        })
+        return JSONResponse(_result_response(result))
     
     except Exception as e:
         logging.error(f"處理請求時發生錯誤: {str(e)}")
@@ -734,27 +748,91 @@ async def transcribe(
 @app.post("/transcribe")
 async def transcribe_root(
     file: UploadFile = File(...),
-    output_formats: str = Form(None)
+    output_formats: str = Form(None),
+    wait_summary: bool = Form(True)
 ):
     # Forward the request to the main transcribe endpoint
-    return await transcribe(file, output_formats)
+    return await transcribe(file, output_formats, wait_summary)
+
+def _parse_range(range_header: str, file_size: int) -> Optional[tuple]:
+    """解析單一區段的 Range 標頭，回傳 (start, end)；格式不支援時回傳 None"""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else file_size - 1
+    else:
+        # bytes=-N：最後 N 個位元組
+        start = max(file_size - int(match.group(2)), 0)
+        end = file_size - 1
+    return start, min(end, file_size - 1)
+
+async def _iter_file_range(f, start: int, end: int):
+    """由已開啟的檔案讀取區段；檔案在傳送途中被替換時仍讀取開啟時的版本"""
+    with f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = await asyncio.to_thread(f.read, min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
 
 @app.get(f"{PREFIX}/download/{{session_id}}/{{filename}}")
-async def download_file(session_id: str, filename: str):
+async def download_file(session_id: str, filename: str, request: Request):
     filename = unquote(filename)
     # Use absolute path for reliability
     base_dir = Path(__file__).parent.parent
-    file_path = base_dir / "temp" / session_id / filename
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    temp_root = (base_dir / "temp").resolve()
+    file_path = (temp_root / session_id / filename).resolve()
+    if temp_root not in file_path.parents or not file_path.is_file():
+        raise HTTPException(status_code=404, detail=f"File not found: {filename}")
     media_type = "application/zip" if filename.endswith(".zip") else "application/octet-stream"
-    import io; content = open(file_path, "rb").read(); logging.info(f"Sending {len(content)} bytes"); return StreamingResponse(io.BytesIO(content), media_type=media_type, headers={"Content-Disposition": f"attachment; filename={filename}", "Content-Length": str(len(content))})
+    f = open(file_path, "rb")
+    stat = os.fstat(f.fileno())
+    file_size = stat.st_size
+    # ZIP 可能在摘要完成後被替換，以 ETag / Last-Modified 識別檔案版本
+    etag = f'"{stat.st_mtime_ns:x}-{file_size:x}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    
+    # 支援 HTTP Range，大型壓縮檔可續傳；If-Range 與目前版本不符時改傳完整檔案，避免拼接兩個版本
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() not in (etag, last_modified):
+        range_header = None
+    byte_range = _parse_range(range_header, file_size) if range_header else None
+    if byte_range:
+        start, end = byte_range
+        if start >= file_size or start > end:
+            f.close()
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+        logging.info(f"Sending bytes {start}-{end}/{file_size} of {filename}")
+        return StreamingResponse(
+            _iter_file_range(f, start, end),
+            status_code=206,
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}",
+                "Content-Range": f"bytes {start}-{end}/{file_size}",
+                "Content-Length": str(end - start + 1),
+                "Accept-Ranges": "bytes",
+                "ETag": etag,
+                "Last-Modified": last_modified
+            }
+        )
+    
+    f.close()
+    logging.info(f"Sending {file_size} bytes of {filename}")
+    return FileResponse(file_path, media_type=media_type, filename=filename,
+                        headers={"Accept-Ranges": "bytes", "ETag": etag, "Last-Modified": last_modified})
 
 # Add a new endpoint that matches the frontend's download request path
 @app.get("/download/{session_id}/{filename}")
-async def download_file_root(session_id: str, filename: str):
+async def download_file_root(session_id: str, filename: str, request: Request):
     # Forward the request to the main download_file endpoint
-    return await download_file(session_id, filename)
+    return await download_file(session_id, filename, request)
 
 @app.post(f"{PREFIX}/clean-temp")
 async def clean_temp_files(password_data: PasswordModel):
@@ -776,6 +854,7 @@ async def clean_temp_files(password_data: PasswordModel):
                         shutil.rmtree(item_path, ignore_errors=True)
                     else:
                         os.remove(item_path)
+                transcription_service.summaries.clear()
                 
                 logging.info("成功清空暫存檔案")
                 return JSONResponse({"success": True, "message": "成功清空暫存檔案"})
@@ -828,6 +907,30 @@ async def get_temp_size():
         traceback.print_exc()
         return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.get(f"{PREFIX}/summary/{{session_id}}")
+async def get_summary(session_id: str):
+    """查詢摘要狀態（pending / done / failed），不等待摘要時用來取得稍後完成的摘要"""
+    state = transcription_service.get_summary(session_id) if re.fullmatch(r"[\w-]+", session_id) else None
+    if state is None:
+        raise HTTPException(status_code=404, detail="Summary not found")
+    return JSONResponse({"session_id": session_id, **state})
+
+@app.get(f"{PREFIX}/render/{{session_id}}/{{fmt}}")
+async def render_format(session_id: str, fmt: str):
+    """按需產生指定輸出格式（txt / srt / vtt / tsv / json），內容來自工作目錄中保存的轉錄結果"""
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    result_path = Path("temp") / session_id / RESULT_FILENAME
+    if not re.fullmatch(r"[\w-]+", session_id) or not result_path.exists():
+        raise HTTPException(status_code=404, detail="Result not found")
+    result = json.loads(await asyncio.to_thread(result_path.read_text, encoding="utf-8"))
+    return Response(render(result, fmt), media_type=MEDIA_TYPES[fmt])
+
+@app.get(f"{PREFIX}/keys/usage")
+async def get_key_usage():
+    """各 API Key 最近一小時已使用的音訊秒數與 LLM tokens"""
+    return JSONResponse({"keys": groq_service.pool.usage()})
+
 # Add new endpoints that match the frontend's request paths
 @app.get("/temp-size")
 async def get_temp_size_root():
@@ -844,15 +947,21 @@ async def transcribe_link(request: LinkRequest):
     try:
         logging.info(f"接收到轉錄連結請求: {request.url}, 格式: {request.output_formats}")
         
+        # 同步請求也記錄為工作：服務中途重啟時會自動續跑，結果可由 /jobs/{session_id} 取得
+        session_id = str(uuid.uuid4())
+        job_manager.track("link", {"url": request.url, "output_formats": request.output_formats, "wait_summary": request.wait_summary}, session_id)
+        
         # 處理音頻
-        result = await transcription_service.process_link(request)
+        try:
+            result = await transcription_service.process_link(request, session_id=session_id)
+        except Exception as e:
+            job_manager.finish(session_id, error=str(getattr(e, "detail", None) or e))
+            raise
+        response = _result_response(result)
+        job_manager.finish(session_id, response)
         
         # 返回結果
-        zip_url = f"{PREFIX}/download/{result['session_id']}/{result['filename']}.zip"
-        return JSONResponse({
-            "data": result["data"],
-            "zip_url": zip_url
-        })
+        return JSONResponse(response)
     except Exception as e:
         logging.error(f"處理連結時發生錯誤: {str(e)}")
         traceback.print_exc()
@@ -861,9 +970,132 @@ async def transcribe_link(request: LinkRequest):
             detail=str(e)
         )
 
+# ---- 非同步工作 API：提交後立即回傳 job ID，再以狀態 / 部分結果端點查詢 ----
+
+async def run_job(job: Dict[str, Any], on_event: Callable) -> Dict[str, Any]:
+    """由工作佇列呼叫，執行上傳或連結轉錄工作"""
+    payload = job["payload"]
+    if job["kind"] == "upload":
+        result = await transcription_service.process_file(
+            Path(payload["input_path"]), payload["filename"], payload["output_formats"], job["id"], on_event=on_event,
+            wait_summary=payload.get("wait_summary", False)
+        )
+    else:
+        link_request = LinkRequest(url=payload["url"], output_formats=payload["output_formats"], wait_summary=payload.get("wait_summary", False))
+        result = await transcription_service.process_link(link_request, session_id=job["id"], on_event=on_event)
+    return _result_response(result)
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_manager.set_runner(run_job)
+    await job_manager.start()
+
+def _job_response(job_id: str) -> Dict[str, Any]:
+    return {
+        "job_id": job_id,
+        "status_url": f"{PREFIX}/jobs/{job_id}",
+        "partial_url": f"{PREFIX}/jobs/{job_id}/partial",
+        "events_url": f"{PREFIX}/jobs/{job_id}/events",
+    }
+
+@app.post(f"{PREFIX}/jobs")
+async def submit_job(
+    file: UploadFile = File(...),
+    output_formats: str = Form(None),
+    wait_summary: bool = Form(False)
+):
+    formats = ["txt", "srt", "vtt", "tsv", "json"]
+    if output_formats:
+        formats = json.loads(output_formats)
+    
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file name provided")
+    
+    job_id = str(uuid.uuid4())
+    try:
+        input_path = await transcription_service.save_upload(file, job_id)
+    except Exception as e:
+        logging.error(f"保存上傳文件失敗: {str(e)}")
+        shutil.rmtree(Path("temp") / job_id, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    job_manager.submit("upload", {
+        "input_path": str(input_path),
+        "filename": file.filename,
+        "output_formats": formats,
+        "wait_summary": wait_summary
+    }, job_id=job_id)
+    return JSONResponse(_job_response(job_id), status_code=202)
+
+@app.post(f"{PREFIX}/jobs/link")
+async def submit_link_job(request: LinkJobRequest):
+    job_id = job_manager.submit("link", {"url": request.url, "output_formats": request.output_formats, "wait_summary": request.wait_summary})
+    return JSONResponse(_job_response(job_id), status_code=202)
+
+@app.get(f"{PREFIX}/jobs/{{job_id}}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    partial = job_manager.get_partial(job_id)
+    return JSONResponse({
+        "job_id": job_id,
+        "status": job["status"],
+        "chunks_done": partial["chunks_done"],
+        "chunks_total": partial["chunks_total"],
+        "result": job["result"],
+        "error": job["error"]
+    })
+
+@app.get(f"{PREFIX}/jobs/{{job_id}}/partial")
+async def get_job_partial(job_id: str):
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(job_manager.get_partial(job_id))
+
+@app.get(f"{PREFIX}/jobs/{{job_id}}/events")
+async def stream_job_events(job_id: str):
+    """以 Server-Sent Events 串流工作進度；chunk 事件帶有該片段的逐字稿"""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        async for event in job_manager.subscribe(job_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = json.dumps(event["data"], ensure_ascii=False)
+            yield f"id: {event['seq']}\nevent: {event['stage']}\ndata: {data}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post(f"{PREFIX}/jobs/{{job_id}}/resume")
+async def resume_job(job_id: str):
+    """重新執行已結束的工作：沿用已預處理的片段與已完成片段的結果，只轉錄失敗或缺少的片段"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["kind"] == "upload" and not Path(job["payload"]["input_path"]).exists():
+        # 失敗時尚未預處理出片段的上傳工作，工作目錄已被清除，只能重新上傳
+        raise HTTPException(status_code=409, detail="Uploaded file is no longer available, please upload again")
+    if not job_manager.resume(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return JSONResponse(_job_response(job_id), status_code=202)
+
+@app.post(f"{PREFIX}/jobs/{{job_id}}/cancel")
+async def cancel_job(job_id: str):
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    cancelled = job_manager.cancel(job_id)
+    return JSONResponse({"success": cancelled})
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8002, reload=True)
+    uvicorn.run("main:app", host="0.0.0.0", port=8002)
 
 # Frontend SPA catch-all - must be at the end after all API routes
 @app.get("/s2t/{path:path}", response_class=HTMLResponse)
@@ -0,0 +1,93 @@
+"""
+Output Renderers
+將轉錄結果直接轉為各輸出格式的字串，並在記憶體中建立 ZIP
+不必先寫檔再讀回，也可以在使用者要求時才產生指定格式
+"""
+import io
+import json
+import zipfile
+from typing import Dict, Any, List, Optional
+
+MEDIA_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "srt": "application/x-subrip; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "tsv": "text/tab-separated-values; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+}
+
+def format_timestamp(seconds: float, format: str = "srt") -> str:
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    milliseconds = int((seconds - int(seconds)) * 1000)
+    seconds = int(seconds)
+
+    if format == "srt":
+        return f"{int(hours):02d}:{int(minutes):02d}:{seconds:02d},{milliseconds:03d}"
+    elif format == "vtt":
+        return f"{int(hours):02d}:{int(minutes):02d}:{seconds:02d}.{milliseconds:03d}"
+    return str(seconds)
+
+def transcript_text(result: Dict[str, Any]) -> str:
+    """txt 輸出的內容：優先使用 LLM 校正後的繁體中文"""
+    if "corrected_text" in result and result["corrected_text"]:
+        return result["corrected_text"]
+    return "\n".join(segment["text"].strip() for segment in result["segments"])
+
+def render_txt(result: Dict[str, Any]) -> str:
+    return transcript_text(result)
+
+def render_srt(result: Dict[str, Any]) -> str:
+    lines = []
+    for i, segment in enumerate(result["segments"], start=1):
+        start_time = format_timestamp(segment["start"], format="srt")
+        end_time = format_timestamp(segment["end"], format="srt")
+        lines.append(f"{i}\n{start_time} --> {end_time}\n{segment['text'].strip()}\n\n")
+    return "".join(lines)
+
+def render_vtt(result: Dict[str, Any]) -> str:
+    lines = ["WEBVTT\n\n"]
+    for i, segment in enumerate(result["segments"], start=1):
+        start_time = format_timestamp(segment["start"], format="vtt")
+        end_time = format_timestamp(segment["end"], format="vtt")
+        lines.append(f"{i}\n{start_time} --> {end_time}\n{segment['text'].strip()}\n\n")
+    return "".join(lines)
+
+def render_tsv(result: Dict[str, Any]) -> str:
+    lines = ["start\tend\ttext\n"]
+    for segment in result["segments"]:
+        lines.append(f"{segment['start']}\t{segment['end']}\t{segment['text'].strip()}\n")
+    return "".join(lines)
+
+def render_json(result: Dict[str, Any]) -> str:
+    return json.dumps(result, ensure_ascii=False, indent=2)
+
+RENDERERS = {
+    "txt": render_txt,
+    "srt": render_srt,
+    "vtt": render_vtt,
+    "tsv": render_tsv,
+    "json": render_json,
+}
+
+def render(result: Dict[str, Any], fmt: str) -> str:
+    if fmt not in RENDERERS:
+        raise ValueError(f"不支援的輸出格式: {fmt}")
+    return RENDERERS[fmt](result)
+
+def render_outputs(result: Dict[str, Any], output_formats: List[str], overrides: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """產生要求的各格式內容；overrides 可指定某些格式的固定內容"""
+    overrides = overrides or {}
+    return {
+        fmt: overrides[fmt] if fmt in overrides else render(result, fmt)
+        for fmt in output_formats
+        if fmt in RENDERERS
+    }
+
+def build_zip(files: Dict[str, str]) -> bytes:
+    """在記憶體中建立 ZIP，files 為 {檔名: 內容}"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for name, content in files.items():
+            zip_file.writestr(name, content)
+    return buffer.getvalue()
@@ -0,0 +1,82 @@
+"""
+OpenCC 繁體轉換微基準
+以合成的 3 小時簡體中文逐字稿比較：
+  - before：整段全文轉換一次，再逐個 segment 各轉換一次（舊的 to_traditional 流程）
+  - after：所有 segment 以換行串接後只轉換一次（convert_lines）
+  - threads：將同一批 segments 分成 N 份交給執行緒池並行轉換，用來判斷 OpenCC 綁定是否釋放 GIL
+
+用法：python benchmarks/bench_opencc.py [--hours 3] [--threads 4] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opencc import OpenCC
+from app.groq_service import convert_lines, _thread_converter
+
+# 中文語速約每秒 4 個字，每個 segment 約 5 秒
+CHARS_PER_SEC = 4
+SEGMENT_SEC = 5
+SENTENCES = [
+    "我们今天讨论的是软件开发中的性能优化问题",
+    "这个程序在处理大量数据的时候会占用很多内存",
+    "网络请求的延迟对用户体验有非常大的影响",
+    "数据库查询需要建立合适的索引才能提高效率",
+    "团队决定下个月发布新版本并且修复已知的问题",
+]
+
+def build_segments(hours: float):
+    total_chars = int(hours * 3600 * CHARS_PER_SEC)
+    per_segment = CHARS_PER_SEC * SEGMENT_SEC
+    text = "".join(SENTENCES[i % len(SENTENCES)] + "，" for i in range(total_chars // 10 + 1))
+    return [text[i:i + per_segment] for i in range(0, total_chars, per_segment)]
+
+def before(segments):
+    cc = OpenCC('s2twp')
+    cc.convert("".join(segments))
+    return [cc.convert(seg) for seg in segments]
+
+def after(segments):
+    return convert_lines(segments)
+
+def threaded(segments, workers):
+    size = -(-len(segments) // workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batches = executor.map(convert_lines, [segments[i:i + size] for i in range(0, len(segments), size)])
+        return [line for batch in batches for line in batch]
+
+def best_of(repeat, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    segments = build_segments(args.hours)
+    chars = sum(len(seg) for seg in segments)
+    # 預先建立轉換器，不把載入字典的時間算進去
+    _thread_converter()
+    print(f"OpenCC 模組: {OpenCC.__module__}")
+    print(f"{args.hours:g} 小時逐字稿：{len(segments)} 個 segments，{chars} 字")
+    results = {
+        "before (全文 + 逐段)": best_of(args.repeat, before, segments),
+        "after (一次批次轉換)": best_of(args.repeat, after, segments),
+        f"threads x{args.threads}": best_of(args.repeat, threaded, segments, args.threads),
+    }
+    for name, seconds in results.items():
+        print(f"{name:24s} {seconds * 1000:10.1f} ms")
+
+if __name__ == "__main__":
+    main()
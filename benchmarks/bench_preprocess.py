@@ -0,0 +1,107 @@
+"""
+音訊預處理基準：以 1 / 3 / 6 小時的輸入比較切割與端對端預處理的耗時
+  split-before  舊版 split_audio：每個片段各啟動一次 ffmpeg（-i 之後才 -ss，每段都從頭解碼）
+  split-after   單次解碼以 segment muxer 切割（與舊版相同輸出 16kHz WAV）
+  e2e-before    舊版上傳流程：先壓縮為 32kbps MP3，超過 24MB 時再以 split_audio 解碼切成 WAV
+  e2e-after     preprocess_audio：一次 ffmpeg 直接輸出 API 可用的 MP3 片段（含 silencedetect 規劃切點）
+輸入預設以 ffmpeg 合成（粉紅雜訊，每 30 秒穿插 1 秒靜音），也可用 --input 指定實際錄音
+每個情境回報耗時、片段數與片段總大小（即需要上傳的資料量）
+
+用法：python benchmarks/bench_preprocess.py [--hours 1 3 6] [--scenarios ...] [--input FILE] [--workdir DIR]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.audio import FFMPEG_PATH, CHUNK_DURATION_SEC, MAX_FILE_SIZE_MB, get_audio_duration, preprocess_audio
+
+SCENARIOS = ("split-before", "split-after", "e2e-before", "e2e-after")
+
+def run(cmd):
+    subprocess.run(cmd, capture_output=True, check=True)
+
+def make_input(hours: float, workdir: str) -> str:
+    """合成測試音訊（44.1kHz 立體聲 128kbps MP3），已存在時沿用"""
+    path = os.path.join(workdir, f"input_{hours:g}h.mp3")
+    if not os.path.exists(path):
+        print(f"合成 {hours:g} 小時的測試音訊...")
+        run([
+            FFMPEG_PATH, "-y", "-f", "lavfi",
+            "-i", f"anoisesrc=color=pink:amplitude=0.2:sample_rate=44100:duration={hours * 3600}",
+            "-af", "volume=enable='lt(mod(t,30),1)':volume=0",
+            "-ac", "2", "-b:a", "128k", path
+        ])
+    return path
+
+def split_per_chunk(audio_path: str, out_dir: str, chunk_duration: int = CHUNK_DURATION_SEC):
+    """舊版 split_audio"""
+    duration = get_audio_duration(audio_path)
+    for i in range(int(duration / chunk_duration) + 1):
+        run([
+            FFMPEG_PATH, "-y", "-i", audio_path,
+            "-ss", str(i * chunk_duration), "-t", str(chunk_duration),
+            "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le",
+            os.path.join(out_dir, f"chunk_{i:03d}.wav")
+        ])
+
+def split_single_pass(audio_path: str, out_dir: str, chunk_duration: int = CHUNK_DURATION_SEC):
+    run([
+        FFMPEG_PATH, "-y", "-i", audio_path,
+        "-vn", "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le",
+        "-f", "segment", "-segment_time", str(chunk_duration), "-reset_timestamps", "1",
+        os.path.join(out_dir, "chunk_%03d.wav")
+    ])
+
+def e2e_before(audio_path: str, out_dir: str):
+    compressed = os.path.join(out_dir, "compressed.mp3")
+    run([FFMPEG_PATH, "-y", "-i", audio_path, "-vn", "-ar", "16000", "-ac", "1", "-b:a", "32k", compressed])
+    if os.path.getsize(compressed) / (1024 * 1024) > MAX_FILE_SIZE_MB:
+        split_per_chunk(compressed, out_dir)
+        os.remove(compressed)
+
+def e2e_after(audio_path: str, out_dir: str):
+    asyncio.run(preprocess_audio(audio_path, out_dir))
+
+RUNNERS = {
+    "split-before": split_per_chunk,
+    "split-after": split_single_pass,
+    "e2e-before": e2e_before,
+    "e2e-after": e2e_after,
+}
+
+def measure(scenario: str, audio_path: str, workdir: str) -> tuple:
+    out_dir = tempfile.mkdtemp(dir=workdir)
+    try:
+        started = time.perf_counter()
+        RUNNERS[scenario](audio_path, out_dir)
+        seconds = time.perf_counter() - started
+        chunks = [os.path.join(out_dir, name) for name in os.listdir(out_dir) if name.endswith((".wav", ".mp3"))]
+        return seconds, len(chunks), sum(os.path.getsize(path) for path in chunks)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--input", help="使用指定的音訊檔，取代合成的輸入")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "s2t-bench"))
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    inputs = [args.input] if args.input else [make_input(hours, args.workdir) for hours in args.hours]
+    print(f"{'輸入':24s} {'情境':14s} {'耗時(秒)':>10s} {'片段數':>6s} {'總大小(MB)':>10s}")
+    for audio_path in inputs:
+        for scenario in args.scenarios:
+            seconds, count, size = measure(scenario, audio_path, args.workdir)
+            print(f"{os.path.basename(audio_path):24s} {scenario:14s} {seconds:10.1f} {count:6d} {size / (1024 * 1024):10.1f}")
+
+if __name__ == "__main__":
+    main()
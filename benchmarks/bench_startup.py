@@ -0,0 +1,83 @@
+"""
+冷啟動基準：比較匯入 app.main 的時間與常駐記憶體（RSS）
+  - before：先匯入 whisper（連帶 torch），加上 --with-model 時再載入模型，模擬舊版在匯入時載入本地模型
+  - after：只匯入 app.main（whisper / torch 延後到第一次本地轉錄才載入）
+每種情境各在新的 Python 行程中執行，取多次中的最佳值
+加上 --importtime 時另以 python -X importtime 列出 after 情境最耗時的模組
+
+用法：python benchmarks/bench_startup.py [--repeat 3] [--with-model small] [--importtime 15]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - started
+# Linux 的 ru_maxrss 單位為 KB
+print(json.dumps({{"seconds": seconds, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "torch": "torch" in sys.modules}}))
+"""
+
+def scenario_imports(name: str, model: str) -> str:
+    if name == "after":
+        return "import app.main"
+    lines = ["import whisper", "import app.main"]
+    if model:
+        lines.append(f"whisper.load_model({model!r})")
+    return "\n".join(lines)
+
+def probe(imports: str) -> dict:
+    process = subprocess.run(
+        [sys.executable, "-c", PROBE.format(imports=imports)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "failed"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+def importtime(top: int):
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    # 每行格式：import time: 自身 [us] | 累計 [us] | 模組（以縮排表示匯入層級）
+    rows = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative_us, module = line[len("import time:"):].split("|")
+        if cumulative_us.strip().isdigit():
+            rows.append((int(cumulative_us), module.strip()))
+    print(f"\n匯入 app.main 累計耗時最多的 {top} 個模組：")
+    for cumulative_us, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:10.1f} ms  {module}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--with-model", default="", help="before 情境另外載入的 Whisper 模型（例如 small）")
+    parser.add_argument("--importtime", type=int, default=0, help="列出 after 情境最耗時的 N 個模組")
+    args = parser.parse_args()
+
+    for name in ("before", "after"):
+        runs = [probe(scenario_imports(name, args.with_model)) for _ in range(args.repeat)]
+        errors = [run["error"] for run in runs if "error" in run]
+        if errors:
+            print(f"{name:7s} 無法執行: {errors[0]}")
+            continue
+        seconds = min(run["seconds"] for run in runs)
+        rss_mb = min(run["rss_mb"] for run in runs)
+        torch = "已載入" if runs[0]["torch"] else "未載入"
+        print(f"{name:7s} 匯入 {seconds:7.2f} 秒  RSS {rss_mb:8.1f} MB  torch {torch}")
+
+    if args.importtime:
+        importtime(args.importtime)
+
+if __name__ == "__main__":
+    main()
@@ -49,7 +49,7 @@ cd /var/www/defintek.io/public_html/s2t
 source venv/bin/activate
 
 # Start the backend server in the background
-python -m uvicorn app.main:app --host 127.0.0.1 --port 8002 --reload &
+python -m uvicorn app.main:app --host 127.0.0.1 --port 8002 &
 
 # Start the frontend server
 cd frontend
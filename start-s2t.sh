@@ -18,4 +18,5 @@ cp -r build/* /var/www/defintek.io/public_html/s2t/
 cd ..
 
 # Start the Python backend server in the background
-python3 -m uvicorn app.main:app --host 127.0.0.1 --port 8002 --reload &
+# 不使用 --reload：程式碼變更不應中斷進行中的轉錄工作（未完成的工作會在啟動時自動續跑）
+python3 -m uvicorn app.main:app --host 127.0.0.1 --port 8002 &
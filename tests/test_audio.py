@@ -0,0 +1,14 @@
+"""片段切點規劃測試"""
+from app.audio import plan_boundaries, BOUNDARY_SEARCH_SEC
+
+
+def test_plan_boundaries_avoids_tiny_tail_chunk():
+    # 提早在靜音處切割後，剩餘 610 秒仍在 target + BOUNDARY_SEARCH_SEC 內，不應再切出 10 秒的尾段
+    assert plan_boundaries(1205, [(594, 596)], 600, 1205) == [595]
+
+
+def test_plan_boundaries_respects_max_duration():
+    boundaries = plan_boundaries(3600, [], 600, 3600)
+    edges = [0.0, *boundaries, 3600]
+    assert all(end - start <= 600 + BOUNDARY_SEARCH_SEC for start, end in zip(edges, edges[1:]))
+    assert plan_boundaries(1205, [(594, 596)], 600, 600) == [595, 1195]
@@ -0,0 +1,18 @@
+"""速率限制等待時間解析測試"""
+import pytest
+
+from app.groq_service import parse_rate_limit_wait, DEFAULT_RATE_LIMIT_WAIT
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("Rate limit reached. Please try again in 7m12.5s.", 433.5),
+    ("Rate limit reached. Please try again in 2h3m4s.", 7385),
+    ("Rate limit reached. Please try again in 350ms.", 1.35),
+])
+def test_parse_rate_limit_wait(message, expected):
+    # 解析出的等待時間再加 1 秒緩衝
+    assert parse_rate_limit_wait(message) == pytest.approx(expected)
+
+
+def test_parse_rate_limit_wait_without_duration():
+    assert parse_rate_limit_wait("Rate limit reached.") == DEFAULT_RATE_LIMIT_WAIT
@@ -0,0 +1,44 @@
+"""
+上傳串流寫入磁碟的記憶體上限測試
+以產生資料的假檔案模擬大型上傳，確認 save_upload 的記憶體用量不隨檔案大小增加
+"""
+import asyncio
+import importlib
+import tracemalloc
+
+from starlette.datastructures import UploadFile
+
+UPLOAD_SIZE = 256 * 1024 * 1024
+
+
+class GeneratedFile:
+    """每次 read 只產生要求的位元組數，本身不保留上傳內容"""
+
+    def __init__(self, size: int):
+        self.remaining = size
+
+    def read(self, n: int = -1) -> bytes:
+        if n < 0:
+            n = self.remaining
+        n = min(n, self.remaining)
+        self.remaining -= n
+        return b"\0" * n
+
+
+def test_save_upload_memory_is_bounded(tmp_path, monkeypatch):
+    # main 匯入時會在工作目錄建立快取與工作資料庫，改在暫存目錄中執行
+    monkeypatch.chdir(tmp_path)
+    main = importlib.import_module("app.main")
+    upload = UploadFile(GeneratedFile(UPLOAD_SIZE), filename="large.mov")
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        input_path = asyncio.run(main.transcription_service.save_upload(upload, "upload-test"))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert input_path.stat().st_size == UPLOAD_SIZE
+    # 讀取下一個區塊時前一個區塊尚未釋放，最多同時存在兩個區塊（另加少量額外配置）
+    assert peak - baseline <= 3 * main.UPLOAD_CHUNK_SIZE